@@ -0,0 +1,199 @@
+# =============================================================================
+# EDA ASSET BUNDLE — compressed, versioned figures with an integrity manifest
+#
+# The dashboard's seven figures (Plotly JSON + one PNG) ship as a local
+# bundle under assets/:
+#   assets/manifest.json                    bundle version + per-file sha256
+#   assets/<stem>.<sha8>.json.gz            minified, gzipped Plotly JSON
+#   assets/<stem>.<sha8>.png                images are stored as-is
+#
+# File names are content-addressed, so a rebuilt bundle never rewrites a
+# file in place; the manifest is swapped in last. Commit assets/ with the app:
+# a deploy that has it never touches the network. The app only reads the
+# bundle; figures missing from it and from disk come from Google Drive.
+#
+# Build / refresh the bundle (from EDA/):
+#   the last cell of "1. Exploratory Data Analysis.ipynb"   # after a full run
+#   python asset_bundle.py                  # bundle jsonvis/ figures
+#   python asset_bundle.py --download       # fetch missing sources first
+# =============================================================================
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ASSET_DIR = os.path.join(HERE, "assets")
+MANIFEST_NAME = "manifest.json"
+
+GDRIVE_IDS = {
+    "area_crimetype_heatmap.json": "1TJiv9xgoa6Kaut-Oi8vL8-T2lngMB6zi",
+    "diurnal_heatmap.json": "1RsLPtfXTXiMNHRWcYpHqN45MpPCfXPpD",
+    "crime_choropleth_map.json": "10zDHrCXcWuwe8MtW1ctKf5FPtNS1hLTp",
+    "time_series_seasonality.json": "1l5-chpbi_n3J8yAUytzF8mJD5jqshURA",
+    "top_crime_annual.json": "1nV7WUgQHpmK-DGagmm5sGc5bOnFFeyco",
+    "arrest_rate.png": "1U6JqhoYsaPMThrGGLOm3zpOH2swAk4oI",
+    "treemap_crime.json": "1I5aYpwtBxWm44qKGewgq3g_NH91SoHiL",
+}
+# ./ holds Drive downloads; the EDA notebook (run from EDA/) writes ../jsonvis/
+SOURCE_DIRS = [HERE, os.path.join(HERE, "jsonvis"),
+               os.path.normpath(os.path.join(HERE, "..", "jsonvis"))]
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# ── Google Drive fallback ────────────────────────────────────────────────────
+def download_asset(name, dest_dir=HERE) -> str:
+    """Download one figure from Google Drive; written atomically."""
+    import gdown
+
+    dest = os.path.join(dest_dir, name)
+    tmp = dest + ".part"
+    url = f"https://drive.google.com/uc?export=download&id={GDRIVE_IDS[name]}"
+    gdown.download(url, tmp, quiet=True)
+    os.replace(tmp, dest)
+    return dest
+
+
+def download_missing(names, dest_dir=HERE, max_workers=None) -> dict:
+    """Download several figures in parallel; returns {name: path or exception}."""
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(names), 1)) as pool:
+        futures = {name: pool.submit(download_asset, name, dest_dir) for name in names}
+        for name, fut in futures.items():
+            try:
+                results[name] = fut.result()
+            except Exception as e:
+                results[name] = e
+    return results
+
+
+# ── Reading ──────────────────────────────────────────────────────────────────
+def read_manifest(asset_dir=ASSET_DIR) -> dict:
+    path = os.path.join(asset_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"bundle_version": None, "files": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def bundled_path(name, manifest, asset_dir=ASSET_DIR):
+    """Path of `name` in the bundle, or None if it is not (fully) present."""
+    entry = manifest["files"].get(name)
+    if entry is None:
+        return None
+    path = os.path.join(asset_dir, entry["path"])
+    return path if os.path.exists(path) else None
+
+
+def read_bundled(name, manifest, asset_dir=ASSET_DIR) -> bytes:
+    """Raw (decompressed) bytes of a bundled figure, integrity-checked."""
+    entry = manifest["files"][name]
+    with open(os.path.join(asset_dir, entry["path"]), "rb") as f:
+        payload = f.read()
+    if sha256_bytes(payload) != entry["sha256"]:
+        raise ValueError(f"{name}: bundle checksum mismatch")
+    return gzip.decompress(payload) if entry["encoding"] == "gzip" else payload
+
+
+def parse_asset(name, data: bytes):
+    """Plotly figure for .json assets, PIL image otherwise."""
+    if name.endswith(".json"):
+        import plotly.io as pio
+        return pio.from_json(data.decode("utf-8"))
+    from PIL import Image
+    return Image.open(io.BytesIO(data))
+
+
+# ── Building ─────────────────────────────────────────────────────────────────
+def find_source(name):
+    """Path of a local (uncompressed) source figure, or None."""
+    for d in SOURCE_DIRS:
+        path = os.path.join(d, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def build_bundle(asset_dir=ASSET_DIR, download=False) -> dict:
+    """Compress every source figure into the bundle and write the manifest."""
+    missing = [n for n in GDRIVE_IDS if find_source(n) is None]
+    if missing and download:
+        print(f"Downloading {len(missing)} missing figure(s) in parallel...")
+        for name, res in download_missing(missing).items():
+            if isinstance(res, Exception):
+                print(f"⚠ {name}: download failed ({res})")
+        missing = [n for n in GDRIVE_IDS if find_source(n) is None]
+    if missing:
+        raise FileNotFoundError(
+            "Source figures not found (run the EDA notebook or pass --download): "
+            + ", ".join(missing)
+        )
+
+    os.makedirs(asset_dir, exist_ok=True)
+    files = {}
+    for name in GDRIVE_IDS:
+        with open(find_source(name), "rb") as f:
+            raw = f.read()
+        stem, ext = os.path.splitext(name)
+        if ext == ".json":
+            # Minify, then gzip — the figures are large text arrays
+            raw = json.dumps(json.loads(raw), separators=(",", ":")).encode("utf-8")
+            payload, encoding, suffix = gzip.compress(raw, compresslevel=9, mtime=0), "gzip", ".json.gz"
+        else:
+            payload, encoding, suffix = raw, "identity", ext
+        digest = sha256_bytes(payload)
+        path = f"{stem}.{digest[:8]}{suffix}"
+        with open(os.path.join(asset_dir, path), "wb") as f:
+            f.write(payload)
+        files[name] = {
+            "path": path,
+            "sha256": digest,
+            "encoding": encoding,
+            "bytes": len(payload),
+            "raw_bytes": len(raw),
+        }
+
+    version = sha256_bytes(
+        "".join(files[n]["sha256"] for n in sorted(files)).encode()
+    )[:12]
+    manifest = {
+        "bundle_version": version,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": files,
+    }
+    tmp = os.path.join(asset_dir, MANIFEST_NAME + ".part")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(asset_dir, MANIFEST_NAME))
+
+    # Drop files from earlier bundle versions
+    keep = {e["path"] for e in files.values()} | {MANIFEST_NAME}
+    for fname in os.listdir(asset_dir):
+        if fname not in keep:
+            os.remove(os.path.join(asset_dir, fname))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the EDA dashboard asset bundle.")
+    parser.add_argument("--download", action="store_true",
+                        help="download source figures missing locally from Google Drive")
+    args = parser.parse_args()
+
+    manifest = build_bundle(download=args.download)
+    raw = sum(e["raw_bytes"] for e in manifest["files"].values())
+    packed = sum(e["bytes"] for e in manifest["files"].values())
+    print(f"✓ Bundle {manifest['bundle_version']}: {len(manifest['files'])} figures, "
+          f"{raw / 1e6:.1f} MB → {packed / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
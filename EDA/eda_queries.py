@@ -0,0 +1,423 @@
+# =============================================================================
+# EDA QUERY LAYER — on-demand aggregates over precomputed crime rollups
+#
+# The dashboard's pre-exported figures are fixed to the filters chosen in
+# "1. Exploratory Data Analysis.ipynb". This module answers the same
+# aggregations for any year range / crime type selection with DuckDB:
+#
+#   build_rollups()   one-off (or after a data refresh):
+#     ProjectData/eda/crimes/Year=YYYY/*.parquet   cleaned incidents, by year
+#     ProjectData/eda/rollups/
+#       community_daily.parquet   date × community area × type → crimes, arrests
+#       hourly_daily.parquet      date × hour × type            → crimes
+#       location_monthly.parquet  month × type × domestic × location → crimes, arrests
+#       tile_daily.parquet        date × H3 tile (res 8) × type → crimes
+#       community_areas.parquet   community area → name, area (km²)
+#
+#   EDAQueryEngine    filter + aggregate the rollups (a few million rows at
+#                     most) and cache results per query in a size-bounded LRU
+#
+# Cleaning matches the notebook: drop 2026, drop rows with missing values,
+# keep the highest ID per Case Number.
+#
+# Usage (from EDA/):
+#   python eda_queries.py                   # build crimes/ + rollups/
+#   engine = EDAQueryEngine()
+#   engine.seasonality("Month", years=(2019, 2025), crime_types=["THEFT"])
+# =============================================================================
+
+import argparse
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import duckdb
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DATA = os.path.normpath(os.path.join(HERE, "..", "ProjectData"))
+RAW_CRIMES = os.path.join(PROJECT_DATA, "ChicagoCrimes(20152025).parquet")
+COMMUNITY_CSV = os.path.join(PROJECT_DATA, "ChicagoCommunityArea.csv")
+EDA_DIR = os.path.join(PROJECT_DATA, "eda")
+ROLLUPS = ["community_daily", "hourly_daily", "location_monthly", "tile_daily",
+           "community_areas"]
+SQFT_TO_KM2 = 9.2903e-8
+
+H3_RESOLUTION = 8
+DATE_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+DAY_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 1. ROLLUP BUILD
+# ═════════════════════════════════════════════════════════════════════════════
+def _area_km2(shape_area: pd.Series) -> pd.Series:
+    """SHAPE_AREA (ft², "1.234.567,89" strings in the CSV) → km², as in the notebook."""
+    if shape_area.dtype == object:
+        shape_area = shape_area.astype(str).str.replace(".", "", regex=False) \
+                                           .str.replace(",", ".", regex=False)
+    return (shape_area.astype(float) * SQFT_TO_KM2).round(2)
+
+
+def _community_names(con):
+    """Register community_names(community_area, community, area_km2) from the polygon CSV."""
+    if os.path.exists(COMMUNITY_CSV):
+        names = pd.read_csv(COMMUNITY_CSV).iloc[:, 1:]
+        names.columns = ["GEOMETRY", "AREA_NUMBER", "COMMUNITY", "AREA_NUM_1",
+                         "SHAPE_AREA", "SHAPE_LEN"]
+        names = pd.DataFrame({
+            "community_area": names["AREA_NUMBER"].astype(int),
+            "community": names["COMMUNITY"].astype(str).str.title(),
+            "area_km2": _area_km2(names["SHAPE_AREA"]),
+        })
+    else:
+        names = pd.DataFrame({"community_area": pd.Series(dtype=int),
+                              "community": pd.Series(dtype=str),
+                              "area_km2": pd.Series(dtype=float)})
+    con.register("community_names", names)
+
+
+def _write_tile_daily(con, crimes_glob, path, batch_size=500_000):
+    """date × H3 tile × type counts; H3 indexing runs in Python, batch by batch."""
+    import h3
+
+    reader = con.execute(f"""
+        SELECT CAST(ts AS DATE) AS date, primary_type, latitude, longitude
+        FROM read_parquet('{crimes_glob}', hive_partitioning = true)
+    """).fetch_record_batch(batch_size)
+
+    parts = []
+    for batch in reader:
+        df = batch.to_pandas()
+        df["h3_address"] = [
+            h3.latlng_to_cell(a, b, H3_RESOLUTION)
+            for a, b in zip(df["latitude"].to_numpy(), df["longitude"].to_numpy())
+        ]
+        parts.append(
+            df.groupby(["date", "h3_address", "primary_type"], observed=True)
+            .size().reset_index(name="crimes")
+        )
+    tiles = (
+        pd.concat(parts, ignore_index=True)
+        .groupby(["date", "h3_address", "primary_type"], observed=True)["crimes"]
+        .sum().reset_index()
+    )
+    tiles["year"] = pd.to_datetime(tiles["date"]).dt.year
+    con.register("tile_counts", tiles)
+    con.execute(f"""
+        COPY (SELECT * FROM tile_counts ORDER BY date)
+        TO '{path}' (FORMAT PARQUET, COMPRESSION ZSTD)
+    """)
+    con.unregister("tile_counts")
+
+
+def build_rollups(raw_path=RAW_CRIMES, out_dir=EDA_DIR, threads=None) -> dict:
+    """Clean + partition the raw crimes parquet and write the rollups."""
+    t0 = time.perf_counter()
+    crimes_dir = os.path.join(out_dir, "crimes")
+    rollup_dir = os.path.join(out_dir, "rollups")
+    os.makedirs(rollup_dir, exist_ok=True)
+    if os.path.isdir(crimes_dir):
+        shutil.rmtree(crimes_dir)
+
+    con = duckdb.connect()
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    _community_names(con)
+
+    # ── Cleaned incidents, partitioned by year ─────────────────────────────
+    con.execute(f"""
+        COPY (
+            SELECT
+                ts, "Year",
+                "Primary Type"                  AS primary_type,
+                "Location Description"          AS location_description,
+                CAST("Arrest" AS BOOLEAN)       AS arrest,
+                CAST("Domestic" AS BOOLEAN)     AS domestic,
+                CAST("Community Area" AS INTEGER) AS community_area,
+                "Latitude"                      AS latitude,
+                "Longitude"                     AS longitude
+            FROM (
+                SELECT *, TRY_STRPTIME(CAST("Date" AS VARCHAR), '{DATE_FORMAT}') AS ts
+                FROM read_parquet('{raw_path}')
+                WHERE "Year" <> 2026 AND COLUMNS(*) IS NOT NULL
+            )
+            WHERE ts IS NOT NULL
+            QUALIFY row_number() OVER (PARTITION BY "Case Number" ORDER BY "ID" DESC) = 1
+        ) TO '{crimes_dir}' (FORMAT PARQUET, PARTITION_BY ("Year"))
+    """)
+    crimes_glob = os.path.join(crimes_dir, "*", "*.parquet")
+    con.execute(f"""
+        CREATE VIEW crimes AS
+        SELECT * FROM read_parquet('{crimes_glob}', hive_partitioning = true)
+    """)
+
+    # ── Rollups ────────────────────────────────────────────────────────────
+    queries = {
+        "community_daily": """
+            SELECT CAST(ts AS DATE) AS date, year(ts) AS year,
+                   c.community_area, coalesce(n.community, CAST(c.community_area AS VARCHAR)) AS community,
+                   primary_type, count(*) AS crimes, sum(CAST(arrest AS INTEGER)) AS arrests
+            FROM crimes c LEFT JOIN community_names n USING (community_area)
+            GROUP BY ALL ORDER BY date
+        """,
+        "hourly_daily": """
+            SELECT CAST(ts AS DATE) AS date, year(ts) AS year, hour(ts) AS hour,
+                   primary_type, count(*) AS crimes
+            FROM crimes GROUP BY ALL ORDER BY date
+        """,
+        "location_monthly": """
+            SELECT CAST(date_trunc('month', ts) AS DATE) AS month, year(ts) AS year,
+                   primary_type, domestic, location_description,
+                   count(*) AS crimes, sum(CAST(arrest AS INTEGER)) AS arrests
+            FROM crimes GROUP BY ALL ORDER BY month
+        """,
+        "community_areas": "SELECT * FROM community_names ORDER BY community_area",
+    }
+    for name, sql in queries.items():
+        path = os.path.join(rollup_dir, f"{name}.parquet")
+        con.execute(f"COPY ({sql}) TO '{path}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+    _write_tile_daily(con, crimes_glob, os.path.join(rollup_dir, "tile_daily.parquet"))
+
+    rows = {
+        name: con.execute(
+            f"SELECT count(*) FROM '{os.path.join(rollup_dir, name + '.parquet')}'"
+        ).fetchone()[0]
+        for name in ROLLUPS
+    }
+    n_crimes = con.execute("SELECT count(*) FROM crimes").fetchone()[0]
+    con.close()
+
+    print(f"✓ {n_crimes:,} cleaned incidents → {crimes_dir}")
+    for name, n in rows.items():
+        print(f"  {name:<17} {n:>12,} rows")
+    print(f"  built in {time.perf_counter() - t0:.1f}s")
+    return rows
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2. QUERY CACHE
+# ═════════════════════════════════════════════════════════════════════════════
+class QueryCache:
+    """LRU cache of query results, bounded by the DataFrames' memory footprint."""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()   # key -> (DataFrame, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, df):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._bytes -= self._items.pop(key)[1]
+            self._items[key] = (df, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {"entries": len(self._items), "bytes": self._bytes,
+                "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3. QUERY ENGINE
+# ═════════════════════════════════════════════════════════════════════════════
+def _freeze(value):
+    # filters are order-insensitive: years is a range, crime_types a set
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(value))
+    return value
+
+
+class EDAQueryEngine:
+    """
+    Filtered EDA aggregates over the rollups. Every public query takes
+    `years` (inclusive (start, end) tuple, None = all) and `crime_types`
+    (list of primary types, None/empty = all) and returns a DataFrame.
+    """
+
+    def __init__(self, rollup_dir=os.path.join(EDA_DIR, "rollups"),
+                 cache_bytes=DEFAULT_CACHE_BYTES):
+        missing = [n for n in ROLLUPS
+                   if not os.path.exists(os.path.join(rollup_dir, f"{n}.parquet"))]
+        if missing:
+            raise FileNotFoundError(
+                f"Rollups not found in {rollup_dir}: {', '.join(missing)}. "
+                "Run `python eda_queries.py` first."
+            )
+        self.con = duckdb.connect()
+        for name in ROLLUPS:
+            path = os.path.join(rollup_dir, f"{name}.parquet")
+            self.con.execute(f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{path}')")
+        self._lock = threading.Lock()
+        self.cache = QueryCache(cache_bytes)
+
+    # ── Internals ────────────────────────────────────────────────────────────
+    def _query(self, name, sql, params, **filters) -> pd.DataFrame:
+        key = (name,) + tuple((k, _freeze(v)) for k, v in sorted(filters.items()))
+        df = self.cache.get(key)
+        if df is None:
+            # one DuckDB connection shared across Streamlit sessions
+            with self._lock:
+                df = self.con.execute(sql, params).df()
+            self.cache.put(key, df)
+        return df
+
+    @staticmethod
+    def _where(years, crime_types, year_col="year", type_col="primary_type"):
+        clauses, params = [], []
+        if years is not None:
+            clauses.append(f"{year_col} BETWEEN ? AND ?")
+            params += sorted(int(y) for y in years)
+        if crime_types:
+            clauses.append(f"{type_col} IN ({', '.join('?' * len(crime_types))})")
+            params += list(crime_types)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    # ── Filter choices ───────────────────────────────────────────────────────
+    def years(self) -> list:
+        return self._query(
+            "years", "SELECT DISTINCT year FROM community_daily ORDER BY year", []
+        )["year"].tolist()
+
+    def crime_types(self) -> list:
+        return self._query(
+            "crime_types",
+            "SELECT primary_type, sum(crimes) AS n FROM community_daily "
+            "GROUP BY primary_type ORDER BY n DESC", [],
+        )["primary_type"].tolist()
+
+    # ── Aggregates (one per dashboard figure) ────────────────────────────────
+    def community_density(self, years=None, crime_types=None) -> pd.DataFrame:
+        """Crimes per km² per community area and year (choropleth)."""
+        where, params = self._where(years, crime_types)
+        return self._query("community_density", f"""
+            WITH t AS (
+                SELECT community_area, community, year, sum(crimes) AS total_crime
+                FROM community_daily {where} GROUP BY ALL
+            )
+            SELECT t.*, a.area_km2, round(t.total_crime / a.area_km2, 0) AS crime_density
+            FROM t LEFT JOIN community_areas a USING (community_area)
+            ORDER BY year, community_area
+        """, params, years=years, crime_types=crime_types)
+
+    def seasonality(self, freq="Month", years=None, crime_types=None) -> pd.DataFrame:
+        """Crime counts per Date / Week / Month / Year (time series)."""
+        trunc = {"Date": "day", "Week": "week", "Month": "month", "Year": "year"}[freq]
+        where, params = self._where(years, crime_types)
+        return self._query("seasonality", f"""
+            SELECT CAST(date_trunc('{trunc}', date) AS DATE) AS "{freq}",
+                   sum(crimes) AS "Cases"
+            FROM community_daily {where}
+            GROUP BY 1 ORDER BY 1
+        """, params, freq=freq, years=years, crime_types=crime_types)
+
+    def top_crimes_annual(self, years=None, top_n=10) -> pd.DataFrame:
+        """Yearly counts of the top_n crime types over the period (bar chart)."""
+        where, params = self._where(years, None)
+        return self._query("top_crimes_annual", f"""
+            WITH yearly AS (
+                SELECT primary_type AS "Primary Type", year AS "Year",
+                       sum(crimes) AS "Crime Count"
+                FROM community_daily {where} GROUP BY ALL
+            ), top AS (
+                SELECT "Primary Type" FROM yearly GROUP BY 1
+                ORDER BY sum("Crime Count") DESC LIMIT {int(top_n)}
+            )
+            SELECT * FROM yearly SEMI JOIN top USING ("Primary Type")
+            ORDER BY "Year", "Crime Count" DESC
+        """, params, years=years, top_n=top_n)
+
+    def area_type_heatmap(self, years=None, crime_types=None, top_n=10) -> pd.DataFrame:
+        """Top community areas × top crime types counts (long format)."""
+        where, params = self._where(years, crime_types)
+        return self._query("area_type_heatmap", f"""
+            WITH f AS (SELECT * FROM community_daily {where}),
+            top_c AS (SELECT community FROM f GROUP BY 1 ORDER BY sum(crimes) DESC LIMIT {int(top_n)}),
+            top_t AS (SELECT primary_type FROM f GROUP BY 1 ORDER BY sum(crimes) DESC LIMIT {int(top_n)})
+            SELECT community AS "Community Name", primary_type AS "Primary Type",
+                   sum(crimes) AS "Count"
+            FROM f SEMI JOIN top_c USING (community) SEMI JOIN top_t USING (primary_type)
+            GROUP BY ALL
+        """, params, years=years, crime_types=crime_types, top_n=top_n)
+
+    def diurnal(self, years=None, crime_types=None) -> pd.DataFrame:
+        """Crime counts per day of week × hour (diurnal heatmap)."""
+        where, params = self._where(years, crime_types)
+        df = self._query("diurnal", f"""
+            SELECT isodow(date) - 1 AS dow, hour AS "Hour", sum(crimes) AS "Crime Count"
+            FROM hourly_daily {where}
+            GROUP BY ALL ORDER BY 1, 2
+        """, params, years=years, crime_types=crime_types)
+        return df.assign(DayOfWeek=[DAY_ORDER[d] for d in df["dow"]])
+
+    def arrest_treemap(self, years=None, crime_types=None, min_incidents=50) -> pd.DataFrame:
+        """Incidents and arrest rate per type × domestic × location (treemap leaves)."""
+        where, params = self._where(years, crime_types)
+        return self._query("arrest_treemap", f"""
+            SELECT primary_type AS "Primary Type",
+                   CASE WHEN domestic THEN 'Domestic' ELSE 'Non-Domestic' END AS "Domestic_Label",
+                   location_description AS "Location Description",
+                   sum(crimes) AS "Total_Incidents",
+                   sum(arrests) / sum(crimes) AS "Arrest_Rate"
+            FROM location_monthly {where}
+            GROUP BY ALL HAVING sum(crimes) > {int(min_incidents)}
+        """, params, years=years, crime_types=crime_types, min_incidents=min_incidents)
+
+    def tile_counts(self, start=None, end=None, crime_types=None) -> pd.DataFrame:
+        """Crimes per H3 tile between two dates (inclusive)."""
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("date >= ?")
+            params.append(pd.Timestamp(start).date())
+        if end is not None:
+            clauses.append("date <= ?")
+            params.append(pd.Timestamp(end).date())
+        if crime_types:
+            clauses.append(f"primary_type IN ({', '.join('?' * len(crime_types))})")
+            params += list(crime_types)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        return self._query("tile_counts", f"""
+            SELECT h3_address, sum(crimes) AS crimes
+            FROM tile_daily {where}
+            GROUP BY 1 ORDER BY crimes DESC
+        """, params, start=str(start), end=str(end), crime_types=crime_types)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the EDA crime rollups.")
+    parser.add_argument("--raw", default=RAW_CRIMES, help="raw Chicago crimes parquet")
+    parser.add_argument("--out", default=EDA_DIR, help="output folder")
+    parser.add_argument("--threads", type=int, default=None, help="DuckDB threads")
+    args = parser.parse_args()
+    build_rollups(args.raw, args.out, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,249 @@
-import streamlit as st
-import plotly.io as pio
-import gdown
 import os
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from asset_bundle import (GDRIVE_IDS, bundled_path, download_asset, find_source,
+                          parse_asset, read_bundled, read_manifest)
+
+# Figures come from the committed bundle (assets/, see asset_bundle.py) and
+# are only read when their chart expander is opened. Figures missing from the
+# bundle and from disk are fetched from Google Drive by background threads,
+# started once per server, so the page never waits on the network. Startup
+# only reads manifest.json; the bundle is built offline, never here.
+
 
-gdrive_dict = {'area_crimetype_heatmap.json':'1TJiv9xgoa6Kaut-Oi8vL8-T2lngMB6zi',
-               'diurnal_heatmap.json':'1RsLPtfXTXiMNHRWcYpHqN45MpPCfXPpD',
-               'crime_choropleth_map.json':'10zDHrCXcWuwe8MtW1ctKf5FPtNS1hLTp',
-               'time_series_seasonality.json':'1l5-chpbi_n3J8yAUytzF8mJD5jqshURA',
-               'top_crime_annual.json':'1nV7WUgQHpmK-DGagmm5sGc5bOnFFeyco',
-               'arrest_rate.png':'1U6JqhoYsaPMThrGGLOm3zpOH2swAk4oI',
-               'treemap_crime.json':'1I5aYpwtBxWm44qKGewgq3g_NH91SoHiL'}
+@st.cache_resource
+def asset_state():
+    """Bundle manifest + background downloads of figures missing locally."""
+    manifest = read_manifest()
+    pool = ThreadPoolExecutor(max_workers=len(GDRIVE_IDS))
+    downloads = {
+        name: pool.submit(download_asset, name)
+        for name in GDRIVE_IDS
+        if bundled_path(name, manifest) is None and find_source(name) is None
+    }
+    return {"manifest": manifest, "pool": pool, "downloads": downloads}
 
-file_name = list(gdrive_dict.keys())
 
 if st.button("Reload charts"):
+    # The cached pool is dropped with the cache — stop it first
+    asset_state()["pool"].shutdown(wait=False, cancel_futures=True)
     st.cache_data.clear()
+    st.cache_resource.clear()
 
-@st.cache_data
-def check_file(file_id,file_name):
-    file_type = file_name.split('.')[1]
+asset_state()  # start any background downloads before the first section renders
+
+
+@st.cache_data(show_spinner=False)
+def load_bundled(name, sha256):
+    return parse_asset(name, read_bundled(name, asset_state()["manifest"]))
+
+
+@st.cache_data(show_spinner=False)
+def load_local(path, mtime):
+    name = os.path.basename(path)
+    with open(path, "rb") as f:
+        return parse_asset(name, f.read())
+
+
+def get_asset(name):
+    """(figure, status) with status "ready", "pending" or "failed"."""
+    state = asset_state()
+    manifest = state["manifest"]
+    if bundled_path(name, manifest) is not None:
+        try:
+            return load_bundled(name, manifest["files"][name]["sha256"]), "ready"
+        except ValueError:
+            pass  # checksum mismatch — fall back to a fresh download
+
+    fut = state["downloads"].get(name)
+    if fut is not None and not fut.done():
+        return None, "pending"
+    path = find_source(name)
+    if path is not None:
+        return load_local(path, os.path.getmtime(path)), "ready"
+    if fut is None:
+        state["downloads"][name] = state["pool"].submit(download_asset, name)
+        return None, "pending"
+    return None, "failed"
+
+
+@st.fragment(run_every=2)
+def wait_for_asset(name):
+    fut = asset_state()["downloads"].get(name)
+    if fut is None or fut.done():
+        st.rerun()
+    st.info(f"⏳ Downloading {name} — the chart will appear here once it is ready.")
+
+
+def show_asset(name, render, **kwargs):
+    """Chart in an expander; the figure is only read while it is open."""
+    chart = st.expander("📈 Show chart", on_change="rerun", key=f"chart_{name}")
+    with chart:
+        if not chart.open:
+            return
+        fig, status = get_asset(name)
+        if status == "ready":
+            render(fig, **kwargs)
+        elif status == "pending":
+            wait_for_asset(name)
+        else:
+            st.warning(f"⚠ {name} could not be downloaded. Use \"Reload charts\" to retry.")
+
+
+def section_choropleth():
+    st.header("Crime Density Choropleth Map of Chicago")
+    st.write("A choropleth map of Chicago's crime density (crime/km²) is plotted to visualize the spatial distribution." \
+    "By adjusting the year filter, it is apparent that areas with initially high crime density continue to experience more crime than lower-density areas in the following years. The **central and near-shore areas of Chicago have consistent high crime density**.")
+    show_asset("crime_choropleth_map.json", st.plotly_chart, width='stretch')
+
+
+def section_time_series():
+    st.header("Crime Occurence Time Series Seasonality")
+    st.write("When plotted into a time series, it can be seen that crime occurence have a seasonality pattern. The most notable seasonality pattern is when the crime " \
+    "occurence is plotted by Months. Crimes are at their lowest during the **first few months of the year**  and it gradually increases toward the middle of the year, **peaking in July and August most of the time**. Finally, it continues to decrease by the end of" \
+    " the year and the pattern continues for the following years.")
+    show_asset("time_series_seasonality.json", st.plotly_chart, width='stretch')
 
-    if os.path.exists(file_name):
-        pass
-    else:
-        url = f"https://drive.google.com/uc?export=download&id={file_id}"
-        gdown.download(url, file_name, quiet=False)
-        
-    if file_type == 'json':
-        file_read = pio.read_json(file_name)
-    else:
-        file_read = Image.open(file_name)
 
-    return file_read
+def section_top_crime():
+    st.header("Highest Crime in Chicago Annually")
+    st.write("There are many crime classifications from the dataset and to identify each crime type will become troublesome since some can be classified as noise if it does not bring any value into the EDA. To ensure that " \
+    "the crime types are consistent, the crime types are ranked and the top 10 is the main focus of the EDA. It appears that the crime types are consistent throughout the years " \
+    "with **Theft, Battery, and Criminal Damage** ranking the highest while **others remain in the top 10 but interchange in ranking**.")
+    show_asset("top_crime_annual.json", st.plotly_chart, width='stretch')
 
 
+def section_area_heatmap():
+    st.header("Crime Heatmap of Chicago Community Area")
+    st.write("To understand the amount of crimes that happened in each Chicago Community area, a heatmap was made. Although it only covers the top 10 community area with the highest crime occurence, "
+    "it still provides a guidance for the EDA. For example:")
+    st.markdown("&nbsp;&nbsp;&nbsp;&nbsp;• Theft frequently occurs in Austin, Near North Side, Near West Side, Loop, and West Town")
+    st.markdown("&nbsp;&nbsp;&nbsp;&nbsp;• Battery usually happens in Austin, South Shore North Lawndale, and Humboldt Park") 
+    st.markdown("&nbsp;&nbsp;&nbsp;&nbsp;• Narcotic crimes are highest in North Lawndale and Humboldt Park.")
+    st.write("This suggests that **certain crime types are more prevalent in some areas more than others**.")
+    show_asset("area_crimetype_heatmap.json", st.plotly_chart, width='stretch')
+
+
+def section_diurnal_heatmap():
+    st.header("Heatmap of Diurnal Crime Occurence")
+    st.write("The following heatmap provides information how crime types are distributed throughout the times of day and the days of week. From the heatmap, " \
+    "it is understood that crime rates vary by type depending on the time of day. For example, deceptive crimes usually occur in the middle of the afternoon while criminal " \
+    "damage usually happens from the evening until midnight.")
+    show_asset("diurnal_heatmap.json", st.plotly_chart, width='stretch')
+
+
+def section_arrest_rate():
+    st.header("Crime Arrest Rate")
+    st.write("With the amount of crimes that are happening in Chicago, it is important to understand if the crimes are handled properly. Unfortunately, it was " \
+    "discovered that the arrest rate for the top 10 most occuring crime are in the lower ranks based on the following bar chart. This signifies the importance " \
+    "of estimating and predicting where and when crimes can happen. This will change how crime policing can transform from a reactive approach to a preventive approach.")
+    show_asset("arrest_rate.png", st.image)
+
+
+def section_treemap():
+    st.header("Crime Arrest Rate Treemap")
+    st.write("The treemap visualizes crime arrest rates based on domesticity and location types. Criminal activities committed in public areas such as streets, sidewalks, "
+    "and outside domestic locations were reported to have the lowest rates of arrests, likely due to the strangers' capacity to run away anytime. Domestic incidents occurring " \
+    "within apartments or houses are recorded to have average arrest rates of 5-20%. Retail stores generally in much desireable condition with arrest rate of at least 20%, possibly due to " \
+    "the presence of security and surveillance cameras at the scene.")
+    show_asset("treemap_crime.json", st.plotly_chart)
+
+
+def section_summary():
+    st.title(f"📄Summary")
+    st.write("The exploratory data analysis conducted on Chicago's data crime from 2015 to 2025 gained meaningful insights. It was discovered that not only do crimes have " \
+    "a seasonality pattern based on temporal trends but certain crime types are more frequent in certain parts of Chicago compared to other neighboring areas. It was later revealed in the end that " \
+    "law enforcement authorities still have difficulties in making arrests especially for the most occuring crime types in Chicago namely Theft, Battery, and Criminal Damage. From these discoveries, the team will move forward " \
+    "in possibly developing an ML model that can predict where and when potential crimes may happen, giving law enforcements a shift in strategy from reactive to preventive action.")
+
+
+@st.cache_resource
+def query_engine():
+    """Shared DuckDB engine over ProjectData/eda/rollups (see eda_queries.py)."""
+    from eda_queries import EDAQueryEngine
+    return EDAQueryEngine()
+
+
+@st.cache_data(show_spinner=False)
+def community_geojson():
+    """GeoJSON of the community area polygons, keyed by area number."""
+    from shapely import wkt
+    from shapely.geometry import mapping
+
+    from eda_queries import COMMUNITY_CSV
+
+    areas = pd.read_csv(COMMUNITY_CSV).iloc[:, 1:]
+    features = [
+        {"type": "Feature", "id": int(num), "geometry": mapping(wkt.loads(geom))}
+        for geom, num in zip(areas.iloc[:, 0], areas.iloc[:, 1])
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def section_explorer():
+    st.header("Interactive Explorer")
+    st.write("The charts above are fixed to the filters used in the EDA notebook. Here, the same aggregations are recomputed "
+    "on demand for any year range and crime types, from precomputed rollups of the cleaned dataset.")
+    explorer = st.expander("🔎 Open the explorer", on_change="rerun", key="explorer")
+    with explorer:
+        if explorer.open:
+            explorer_body()
+
+
+def explorer_body():
+    try:
+        engine = query_engine()
+    except (ImportError, FileNotFoundError) as e:
+        st.warning(f"⚠ The explorer needs the EDA rollups: {e}")
+        st.code("pip install duckdb h3\npython eda_queries.py", language="bash")
+        return
+
+    years = engine.years()
+    year_range = st.slider("Years", min_value=years[0], max_value=years[-1],
+                           value=(years[0], years[-1]))
+    crime_types = st.multiselect("Crime types (all if empty)", engine.crime_types())
+    view = st.selectbox("Chart", ["Crime Density by Community Area", "Time Series", "Top Crimes Annually",
+                                  "Community Area Heatmap", "Diurnal Heatmap", "Arrest Rate Treemap"])
+
+    if view == "Crime Density by Community Area":
+        df = engine.community_density(year_range, crime_types)
+        df = df.groupby(["community_area", "community", "area_km2"], as_index=False)["total_crime"].sum()
+        df["crime_density"] = (df["total_crime"] / df["area_km2"]).round(0)
+        fig = px.choropleth_map(df, geojson=community_geojson(), locations="community_area",
+                                color="crime_density", hover_name="community",
+                                color_continuous_scale="Reds", opacity=0.6, zoom=9,
+                                center={"lat": 41.84, "lon": -87.68}, height=650,
+                                labels={"crime_density": "Crimes/km²"})
+    elif view == "Time Series":
+        freq = st.radio("Frequency", ["Date", "Week", "Month", "Year"], index=2, horizontal=True)
+        fig = px.line(engine.seasonality(freq, year_range, crime_types), x=freq, y="Cases")
+    elif view == "Top Crimes Annually":
+        df = engine.top_crimes_annual(year_range)
+        fig = px.bar(df, x="Year", y="Crime Count", color="Primary Type", barmode="group")
+    elif view == "Community Area Heatmap":
+        df = engine.area_type_heatmap(year_range, crime_types)
+        fig = px.density_heatmap(df, x="Primary Type", y="Community Name", z="Count",
+                                 histfunc="sum", color_continuous_scale="Reds", text_auto=True)
+    elif view == "Diurnal Heatmap":
+        df = engine.diurnal(year_range, crime_types)
+        fig = px.density_heatmap(df, x="Hour", y="DayOfWeek", z="Crime Count", histfunc="sum",
+                                 nbinsx=24, category_orders={"DayOfWeek": list(df["DayOfWeek"].unique())},
+                                 color_continuous_scale="Viridis")
+    else:
+        df = engine.arrest_treemap(year_range, crime_types)
+        fig = px.treemap(df, path=[px.Constant("All Crimes"), "Primary Type", "Domestic_Label",
+                                   "Location Description"],
+                         values="Total_Incidents", color="Arrest_Rate",
+                         color_continuous_scale="RdYlGn", height=700)
+
+    st.plotly_chart(fig, width='stretch')
+    stats = engine.cache.stats()
+    st.caption(f"Query cache: {stats['entries']} results, {stats['hits']} hits / {stats['misses']} misses")
 
-fig_heatmap_area_crime = check_file(gdrive_dict[file_name[0]],file_name[0])
-fig_heatmap_diurnal = check_file(gdrive_dict[file_name[1]],file_name[1])
-fig_choropleth = check_file(gdrive_dict[file_name[2]],file_name[2])
-fig_time_series = check_file(gdrive_dict[file_name[3]],file_name[3])
-fig_top_crime = check_file(gdrive_dict[file_name[4]],file_name[4])
-fig_arrest_rate = check_file(gdrive_dict[file_name[5]],file_name[5])
-fig_treemap = check_file(gdrive_dict[file_name[6]],file_name[6])
 
 # ========== MAIN PAGE ==========
 st.title("📊 IT5006 Group 23 - Chicago Crime")
@@ -50,56 +251,12 @@ st.write("An exploratory data analysis was conducted towards Chicago's Crime dat
 "In this analysis, the team's main focus is to gain insights of how crimes behave in Chicago. The insights that the team would try to uncover are where crimes occur, " \
 "what types of crime occur, and when do they happen.")
 
-st.header("Crime Density Choropleth Map of Chicago")
-st.write("A choropleth map of Chicago's crime density (crime/km²) is plotted to visualize the spatial distribution." \
-"By adjusting the year filter, it is apparent that areas with initially high crime density continue to experience more crime than lower-density areas in the following years. The **central and near-shore areas of Chicago have consistent high crime density**.")
-st.plotly_chart(fig_choropleth, width='stretch')
-
-st.header("Crime Occurence Time Series Seasonality")
-st.write("When plotted into a time series, it can be seen that crime occurence have a seasonality pattern. The most notable seasonality pattern is when the crime " \
-"occurence is plotted by Months. Crimes are at their lowest during the **first few months of the year**  and it gradually increases toward the middle of the year, **peaking in July and August most of the time**. Finally, it continues to decrease by the end of" \
-" the year and the pattern continues for the following years.")
-st.plotly_chart(fig_time_series, width='stretch')
-
-st.header("Highest Crime in Chicago Annually")
-st.write("There are many crime classifications from the dataset and to identify each crime type will become troublesome since some can be classified as noise if it does not bring any value into the EDA. To ensure that " \
-"the crime types are consistent, the crime types are ranked and the top 10 is the main focus of the EDA. It appears that the crime types are consistent throughout the years " \
-"with **Theft, Battery, and Criminal Damage** ranking the highest while **others remain in the top 10 but interchange in ranking**.")
-st.plotly_chart(fig_top_crime, width='stretch')
-
-st.header("Crime Heatmap of Chicago Community Area")
-st.write("To understand the amount of crimes that happened in each Chicago Community area, a heatmap was made. Although it only covers the top 10 community area with the highest crime occurence, "
-"it still provides a guidance for the EDA. For example:")
-st.markdown("&nbsp;&nbsp;&nbsp;&nbsp;• Theft frequently occurs in Austin, Near North Side, Near West Side, Loop, and West Town")
-st.markdown("&nbsp;&nbsp;&nbsp;&nbsp;• Battery usually happens in Austin, South Shore North Lawndale, and Humboldt Park") 
-st.markdown("&nbsp;&nbsp;&nbsp;&nbsp;• Narcotic crimes are highest in North Lawndale and Humboldt Park.")
-st.write("This suggests that **certain crime types are more prevalent in some areas more than others**.")
-st.plotly_chart(fig_heatmap_area_crime, width='stretch')
-
-st.header("Heatmap of Diurnal Crime Occurence")
-st.write("The following heatmap provides information how crime types are distributed throughout the times of day and the days of week. From the heatmap, " \
-"it is understood that crime rates vary by type depending on the time of day. For example, deceptive crimes usually occur in the middle of the afternoon while criminal " \
-"damage usually happens from the evening until midnight.")
-st.plotly_chart(fig_heatmap_diurnal, width='stretch')
-
-st.header("Crime Arrest Rate")
-st.write("With the amount of crimes that are happening in Chicago, it is important to understand if the crimes are handled properly. Unfortunately, it was " \
-"discovered that the arrest rate for the top 10 most occuring crime are in the lower ranks based on the following bar chart. This signifies the importance " \
-"of estimating and predicting where and when crimes can happen. This will change how crime policing can transform from a reactive approach to a preventive approach.")
-st.image(fig_arrest_rate)
-# ========== SUMMARY PAGE ==========
-
-st.header("Crime Arrest Rate Treemap")
-st.write("The treemap visualizes crime arrest rates based on domesticity and location types. Criminal activities committed in public areas such as streets, sidewalks, "
-"and outside domestic locations were reported to have the lowest rates of arrests, likely due to the strangers' capacity to run away anytime. Domestic incidents occurring " \
-"within apartments or houses are recorded to have average arrest rates of 5-20%. Retail stores generally in much desireable condition with arrest rate of at least 20%, possibly due to " \
-"the presence of security and surveillance cameras at the scene.")
-st.plotly_chart(fig_treemap)
-# ========== SUMMARY PAGE ==========
-
-st.title(f"📄Summary")
-st.write("The exploratory data analysis conducted on Chicago's data crime from 2015 to 2025 gained meaningful insights. It was discovered that not only do crimes have " \
-"a seasonality pattern based on temporal trends but certain crime types are more frequent in certain parts of Chicago compared to other neighboring areas. It was later revealed in the end that " \
-"law enforcement authorities still have difficulties in making arrests especially for the most occuring crime types in Chicago namely Theft, Battery, and Criminal Damage. From these discoveries, the team will move forward " \
-"in possibly developing an ML model that can predict where and when potential crimes may happen, giving law enforcements a shift in strategy from reactive to preventive action.")
-
+section_choropleth()
+section_time_series()
+section_top_crime()
+section_area_heatmap()
+section_diurnal_heatmap()
+section_arrest_rate()
+section_treemap()
+section_explorer()
+section_summary()
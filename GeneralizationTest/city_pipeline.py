@@ -0,0 +1,470 @@
+# =============================================================================
+# CITY FEATURE PIPELINE — one config-driven, out-of-core pipeline per city
+#
+# Replaces the per-city copies of the Chicago feature engineering in
+# ProcessBostonLA.ipynb. A city is described by a JSON config in cities/
+# (column mapping, bounding box, offense classifier, years), and
+# produces the same feature table the notebooks did:
+#   shift / shift_date, master grid, lag_1d, rolling 7d/30d means,
+#   EWMA density percentile, tile momentum, neighbour lag, city baseline
+#
+# Memory stays bounded by the chunk size and the dense tile grid:
+#   1. Stream the raw parquet in row-group batches; each batch is filtered,
+#      classified, H3-indexed and collapsed to (tile, shift_date, shift)
+#      counts straight away — raw rows are never held in memory together.
+#   2. Scatter the counts into a dense (tiles, days, shifts) array and
+#      compute every feature with array operations along the day axis.
+#   3. Write the feature table one month at a time into a hive-partitioned
+#      parquet dataset (<output_path>/year=YYYY/part-0.parquet). Read it
+#      back with read_features(output_path): a plain pd.read_parquet also
+#      returns the partition key as an extra categorical `year` column.
+#
+# Usage (from GeneralizationTest/):
+#   python city_pipeline.py                        # every config in cities/
+#   python city_pipeline.py cities/la.json --workers 1 --batch-size 100000
+#   df = read_features("FeaturesDataset/LACrimeFeatures.parquet")
+# =============================================================================
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import h3
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from taxonomy import OffenseTaxonomy
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CITY_DIR = os.path.join(HERE, "cities")
+
+RESOLUTION = 8  # Higher number = smaller hexagons e.g. 8 is ~0.7km^2 area
+EPSILON = 1e-6
+SHIFT_ORDER = ["morning_noon", "afternoon_night", "overnight"]
+SHIFT_START_HOUR = {"morning_noon": 6, "afternoon_night": 14, "overnight": 22}
+DEFAULT_BATCH_SIZE = 250_000
+
+FEATURE_COLUMNS = [
+    "h3_address", "shift_date", "shift", "crime_count", "target", "Date", "hour",
+    "lag_1d", "rolling_7d_mean", "rolling_30d_mean",
+    "tile_crime_density_percentile", "tile_momentum",
+    "day_of_week", "month", "day_sin", "day_cos", "month_sin", "month_cos",
+    "is_afternoon_night", "is_overnight", "is_weekend", "is_winter_evening",
+    "neighbor_lag_1d", "city_baseline",
+    "rolling_30d_mean_norm", "rolling_7d_mean_norm", "neighbor_lag_1d_norm",
+    "is_crime_yesterday",
+]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 1. CONFIG
+# ═════════════════════════════════════════════════════════════════════════════
+def load_config(path) -> dict:
+    """Read a city config; relative paths are resolved against this folder."""
+    with open(path) as f:
+        cfg = json.load(f)
+    name = os.path.splitext(os.path.basename(path))[0]
+    cfg.setdefault("taxonomy_table", os.path.join(
+        os.path.dirname(cfg["output_path"]), "taxonomy", f"{name}.json"
+    ))
+    for key in ("raw_path", "output_path", "taxonomy_table"):
+        if not os.path.isabs(cfg[key]):
+            cfg[key] = os.path.normpath(os.path.join(HERE, cfg[key]))
+    cfg.setdefault("extra_columns", [])
+    cfg.setdefault("drop_duplicates", False)
+    cfg.setdefault("dropna", True)
+    cfg.setdefault("exclude", {})
+    cfg.setdefault("bbox", None)
+    cfg.setdefault("drop_zero_coords", False)
+    cfg.setdefault("convert_timezone", None)
+    return cfg
+
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2. STREAMING AGGREGATION — raw incidents → (tile, shift_date, shift) counts
+# ═════════════════════════════════════════════════════════════════════════════
+def _parse_timestamps(chunk, cfg) -> pd.Series:
+    """Local wall-clock timestamps for each incident."""
+    if "timestamp" in chunk:
+        ts = pd.to_datetime(chunk["timestamp"], errors="coerce",
+                            format=cfg.get("timestamp_format"))
+    else:
+        # Date column + separate HHMM time-of-day column (e.g. LA's TIME OCC)
+        date = pd.to_datetime(chunk["date"], errors="coerce",
+                              format=cfg.get("date_format")).dt.normalize()
+        hour = pd.to_numeric(chunk["time_hhmm"], errors="coerce") // 100
+        ts = date + pd.to_timedelta(hour, unit="h")
+    if ts.dt.tz is not None:
+        # Keep the source's wall-clock hours, as the notebooks did; converting
+        # (e.g. a UTC export to local time) is an explicit per-city opt-in
+        if cfg["convert_timezone"]:
+            ts = ts.dt.tz_convert(cfg["convert_timezone"])
+        ts = ts.dt.tz_localize(None)
+    return ts
+
+
+class _Deduplicator:
+    """Exact-row de-duplication across chunks via 64-bit row hashes."""
+
+    def __init__(self):
+        self.seen = np.empty(0, dtype=np.uint64)
+
+    def mask(self, chunk) -> np.ndarray:
+        hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+        keep = np.zeros(len(hashes), dtype=bool)
+        _, first = np.unique(hashes, return_index=True)
+        keep[first] = True
+        if len(self.seen):
+            pos = np.searchsorted(self.seen, hashes).clip(max=len(self.seen) - 1)
+            keep &= self.seen[pos] != hashes
+        self.seen = np.union1d(self.seen, hashes[keep])
+        return keep
+
+
+def _aggregate_chunk(batch, cfg, dedup, taxonomy):
+    """One raw record batch → per (tile, shift_date, shift) count / first crime."""
+    cols = cfg["columns"]
+    chunk = batch.to_pandas()
+    if dedup is not None:
+        chunk = chunk[dedup.mask(chunk)]
+    chunk = chunk.rename(columns={raw: name for name, raw in cols.items()})
+
+    if cfg["dropna"] is True:
+        chunk = chunk.dropna()
+    elif cfg["dropna"]:
+        chunk = chunk.dropna(subset=cfg["dropna"])
+
+    for name, values in cfg["exclude"].items():
+        chunk = chunk[~chunk[name].astype(str).isin(values)]
+
+    lat = pd.to_numeric(chunk["latitude"], errors="coerce")
+    lon = pd.to_numeric(chunk["longitude"], errors="coerce")
+    keep = lat.notna() & lon.notna()
+    if cfg["drop_zero_coords"]:
+        keep &= (lat != 0) & (lon != 0)
+    if cfg["bbox"]:
+        keep &= lat.between(*cfg["bbox"]["lat"]) & lon.between(*cfg["bbox"]["lon"])
+
+    keep &= taxonomy.keep_mask(chunk["offense_description"])
+
+    ts = _parse_timestamps(chunk, cfg)
+    keep &= ts.notna() & ts.dt.year.between(*cfg["years"])
+
+    lat, lon, ts = lat[keep].to_numpy(), lon[keep].to_numpy(), ts[keep]
+    if not len(ts):
+        return None
+
+    hour = ts.dt.hour.to_numpy()
+    shift_date = ts.dt.floor("D").to_numpy().copy()
+    shift_date[hour < 6] -= np.timedelta64(1, "D")
+    out = pd.DataFrame({
+        "h3_address": [h3.latlng_to_cell(a, b, RESOLUTION) for a, b in zip(lat, lon)],
+        "shift_date": shift_date,
+        "shift": np.select([(hour >= 6) & (hour <= 13), (hour >= 14) & (hour <= 21)],
+                           ["morning_noon", "afternoon_night"], default="overnight"),
+        "first_crime": ts.to_numpy(),
+    })
+    return (
+        out.groupby(["h3_address", "shift_date", "shift"], sort=False)["first_crime"]
+        .agg(crime_count="size", first_crime="min")
+        .reset_index()
+    )
+
+
+def stream_shift_counts(cfg, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Stream the raw parquet batch by batch and return
+    (counts frame, tile order, n_records).
+
+    Tiles keep their first-appearance order, like df_shift["h3_address"].unique()
+    in the notebooks.
+    """
+    cols = cfg["columns"]
+    read_cols = list(dict.fromkeys(list(cols.values()) + cfg["extra_columns"]))
+    dedup = _Deduplicator() if cfg["drop_duplicates"] else None
+    taxonomy = OffenseTaxonomy.from_config(cfg)
+    taxonomy.load(cfg["taxonomy_table"])
+
+    parts, tiles, n_records = [], {}, 0
+    pf = pq.ParquetFile(cfg["raw_path"])
+    for batch in pf.iter_batches(batch_size=batch_size, columns=read_cols):
+        part = _aggregate_chunk(batch, cfg, dedup, taxonomy)
+        if part is None:
+            continue
+        tiles.update(dict.fromkeys(part["h3_address"].unique()))
+        n_records += int(part["crime_count"].sum())
+        parts.append(part)
+
+    taxonomy.save(cfg["taxonomy_table"])
+
+    if not parts:
+        raise ValueError(f"{cfg['city']}: no incidents left after filtering.")
+    counts = (
+        pd.concat(parts, ignore_index=True)
+        .groupby(["h3_address", "shift_date", "shift"], sort=False)
+        .agg(crime_count=("crime_count", "sum"), first_crime=("first_crime", "min"))
+        .reset_index()
+    )
+    return counts, list(tiles), n_records
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3. DENSE FEATURE KERNELS — arrays shaped (tiles, days, shifts)
+# ═════════════════════════════════════════════════════════════════════════════
+def _neighbor_index(tiles) -> np.ndarray:
+    """(n_tiles, 6) indices of each tile's 1-ring neighbours; n_tiles = none."""
+    pos = {h: i for i, h in enumerate(tiles)}
+    nbrs = np.full((len(tiles), 6), len(tiles), dtype=np.intp)
+    for i, h in enumerate(tiles):
+        ring = [pos[c] for c in h3.grid_disk(h, 1) if c != h and c in pos]
+        nbrs[i, :len(ring)] = ring
+    return nbrs
+
+
+def _rolling_prior_mean(counts, window) -> np.ndarray:
+    """x.shift(1).rolling(window, min_periods=1).mean() along the day axis."""
+    n_days = counts.shape[1]
+    csum = np.zeros((counts.shape[0], n_days + 1, counts.shape[2]))
+    np.cumsum(counts, axis=1, out=csum[:, 1:])
+    day = np.arange(n_days)
+    lo = np.maximum(day - window, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (csum[:, day] - csum[:, lo]) / np.minimum(day, window)[None, :, None]
+
+
+def _prior_ewma(daily, halflife) -> np.ndarray:
+    """x.shift(1).ewm(halflife, min_periods=1).mean() per tile (rows)."""
+    q = np.exp(-np.log(2) / halflife)
+    out = np.full(daily.shape, np.nan)
+    num = np.zeros(daily.shape[0])
+    den = 0.0
+    for d in range(1, daily.shape[1]):
+        num = daily[:, d - 1] + q * num
+        den = 1.0 + q * den
+        out[:, d] = num / den
+    return out
+
+
+def compute_features(counts, tiles):
+    """
+    Dense feature arrays from the aggregated counts.
+
+    Returns (dates, arrays) where every array is (tiles, days, shifts) or
+    broadcastable to it.
+    """
+    dates = pd.date_range(counts["shift_date"].min(), counts["shift_date"].max(), freq="D")
+    n_tiles, n_days, n_shifts = len(tiles), len(dates), len(SHIFT_ORDER)
+
+    t_idx = pd.Index(tiles).get_indexer(counts["h3_address"])
+    d_idx = dates.get_indexer(counts["shift_date"])
+    s_idx = pd.Index(SHIFT_ORDER).get_indexer(counts["shift"])
+
+    C = np.zeros((n_tiles, n_days, n_shifts))
+    C[t_idx, d_idx, s_idx] = counts["crime_count"].to_numpy()
+    # hour of the first crime in the tile-shift; shift start hour otherwise
+    hour = np.broadcast_to(
+        np.array([SHIFT_START_HOUR[s] for s in SHIFT_ORDER], dtype=np.int8), C.shape
+    ).copy()
+    hour[t_idx, d_idx, s_idx] = counts["first_crime"].dt.hour.to_numpy()
+
+    # Same-shift rolling means (the 1-day lag is sliced from C when writing)
+    rolling_7d = _rolling_prior_mean(C, 7)
+    rolling_30d = _rolling_prior_mean(C, 30)
+
+    # EWMA density percentile and momentum on daily tile totals
+    daily = C.sum(axis=2)
+    ewma_slow = _prior_ewma(daily, 30)
+    ewma_fast = _prior_ewma(daily, 7)
+    percentile = (
+        pd.DataFrame(ewma_slow.T).rank(axis=1, pct=True).fillna(0.5).to_numpy().T
+    )
+    momentum = np.nan_to_num(ewma_fast / (ewma_slow + EPSILON), nan=1.0)
+
+    # Neighbour lag: neighbours' count in the immediately preceding shift
+    flat = C.reshape(n_tiles, n_days * n_shifts)
+    prev = np.zeros((n_tiles + 1, flat.shape[1]))
+    prev[:n_tiles, 1:] = flat[:, :-1]
+    neighbor_lag = np.zeros_like(flat)
+    for ring in _neighbor_index(tiles).T:
+        neighbor_lag += prev[ring]
+    neighbor_lag = neighbor_lag.reshape(C.shape)
+
+    # City baseline: expanding mean of previous days' city daily mean
+    city_daily_mean = C.mean(axis=(0, 2))
+    city_baseline = (
+        pd.Series(city_daily_mean).shift(1).expanding().mean()
+        .fillna(city_daily_mean[0]).to_numpy()
+    )[None, :, None]
+
+    arrays = {
+        "crime_count": C,
+        "hour": hour,
+        "rolling_7d_mean": rolling_7d,
+        "rolling_30d_mean": rolling_30d,
+        "tile_crime_density_percentile": percentile[:, :, None],
+        "tile_momentum": momentum[:, :, None],
+        "neighbor_lag_1d": neighbor_lag,
+        "city_baseline": city_baseline,
+    }
+    return dates, arrays
+
+
+def feature_frame(tiles, dates, arrays, day_slice) -> pd.DataFrame:
+    """Materialise the rows of one day range as the notebook's final_df."""
+    days = dates[day_slice]
+    n_tiles, n_days, n_shifts = len(tiles), len(days), len(SHIFT_ORDER)
+    shape = (n_tiles, n_days, n_shifts)
+    take = lambda a: np.broadcast_to(a[:, day_slice], shape).ravel()  # noqa: E731
+
+    df = pd.DataFrame({
+        "h3_address": np.repeat(np.asarray(tiles, dtype=object), n_days * n_shifts),
+        "shift_date": np.tile(np.repeat(days.to_numpy(), n_shifts), n_tiles),
+        "shift": np.tile(SHIFT_ORDER, n_tiles * n_days),
+    })
+    C = arrays["crime_count"]
+    lag_1d = np.full(shape, np.nan)
+    start, stop = day_slice.start, day_slice.stop
+    lag_1d[:, 1 if start == 0 else 0:] = C[:, max(start - 1, 0):stop - 1]
+
+    df["crime_count"] = take(C)
+    df["target"] = (df["crime_count"] > 0).astype(int)
+    df["Date"] = df["shift_date"] + pd.to_timedelta(df["shift"].map(SHIFT_START_HOUR), unit="h")
+    df["hour"] = take(arrays["hour"]).astype(int)
+    df["lag_1d"] = lag_1d.ravel()
+    for col in ["rolling_7d_mean", "rolling_30d_mean",
+                "tile_crime_density_percentile", "tile_momentum"]:
+        df[col] = take(arrays[col])
+
+    df["day_of_week"] = df["Date"].dt.dayofweek
+    df["month"] = df["Date"].dt.month
+    df["day_sin"] = np.sin(2 * np.pi * df["day_of_week"] / 7)
+    df["day_cos"] = np.cos(2 * np.pi * df["day_of_week"] / 7)
+    df["month_sin"] = np.sin(2 * np.pi * (df["month"] - 1) / 12)
+    df["month_cos"] = np.cos(2 * np.pi * (df["month"] - 1) / 12)
+    df["is_afternoon_night"] = (df["shift"] == "afternoon_night").astype(int)
+    df["is_overnight"] = (df["shift"] == "overnight").astype(int)
+    df["is_weekend"] = df["day_of_week"].isin([5, 6]).astype(int)
+    df["is_winter_evening"] = (
+        df["month"].isin([11, 12, 1, 2]) & (df["shift"] == "afternoon_night")
+    ).astype(int)
+
+    df["neighbor_lag_1d"] = take(arrays["neighbor_lag_1d"])
+    df["city_baseline"] = take(arrays["city_baseline"])
+    norm = df["city_baseline"] + EPSILON
+    df["rolling_30d_mean_norm"] = df["rolling_30d_mean"] / norm
+    df["rolling_7d_mean_norm"] = df["rolling_7d_mean"] / norm
+    df["neighbor_lag_1d_norm"] = df["neighbor_lag_1d"] / norm
+    df["is_crime_yesterday"] = (df["lag_1d"] > 0).astype(int)
+
+    # Drop the NaNs created by the shift (first day of history)
+    return df[FEATURE_COLUMNS].dropna().reset_index(drop=True)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4. DRIVER
+# ═════════════════════════════════════════════════════════════════════════════
+def write_partitioned(tiles, dates, arrays, output_path) -> int:
+    """
+    Write one parquet partition per calendar year, one row group per month
+    (only a month of rows is materialised at a time); returns rows written.
+    """
+    if os.path.isdir(output_path):
+        shutil.rmtree(output_path)
+    elif os.path.exists(output_path):
+        os.remove(output_path)  # single-file output from the old notebook
+
+    rows, writer, writer_year = 0, None, None
+    months = dates.year * 12 + dates.month - 1
+    bounds = np.flatnonzero(np.diff(months)) + 1
+    for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(dates)]):
+        df = feature_frame(tiles, dates, arrays, slice(int(lo), int(hi)))
+        if df.empty:
+            continue
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        year = dates[lo].year
+        if year != writer_year:
+            if writer is not None:
+                writer.close()
+            part_dir = os.path.join(output_path, f"year={year}")
+            os.makedirs(part_dir, exist_ok=True)
+            writer = pq.ParquetWriter(os.path.join(part_dir, "part-0.parquet"), table.schema)
+            writer_year = year
+        writer.write_table(table)
+        rows += len(df)
+    if writer is not None:
+        writer.close()
+    return rows
+
+
+def read_features(output_path, **kwargs) -> pd.DataFrame:
+    """A city's feature table, without the `year` partition column."""
+    return pd.read_parquet(output_path, **kwargs).drop(columns="year", errors="ignore")
+
+
+def run_city(config_path, batch_size=DEFAULT_BATCH_SIZE) -> dict:
+    """Full pipeline for one city config; returns a summary dict."""
+    cfg = load_config(config_path)
+    t0 = time.perf_counter()
+    counts, tiles, n_records = stream_shift_counts(cfg, batch_size)
+    t_stream = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    dates, arrays = compute_features(counts, tiles)
+    rows = write_partitioned(tiles, dates, arrays, cfg["output_path"])
+    t_features = time.perf_counter() - t0
+
+    return {
+        "city": cfg["city"],
+        "records": n_records,
+        "tiles": len(tiles),
+        "days": len(dates),
+        "rows": rows,
+        "output_path": cfg["output_path"],
+        "stream_s": round(t_stream, 1),
+        "features_s": round(t_features, 1),
+    }
+
+
+def run_cities(config_paths, workers=None, batch_size=DEFAULT_BATCH_SIZE) -> list:
+    """Run several cities in parallel processes (one city per process)."""
+    workers = workers or min(len(config_paths), os.cpu_count() or 1)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_city, p, batch_size): p for p in config_paths}
+        for fut in as_completed(futures):
+            try:
+                res = fut.result()
+            except Exception as e:
+                print(f"⚠ {os.path.basename(futures[fut])} failed: {e}")
+                continue
+            results.append(res)
+            print(f"✓ {res['city']}: {res['records']:,} incidents → "
+                  f"{res['rows']:,} tile-shift rows ({res['tiles']:,} tiles × "
+                  f"{res['days']:,} days) in {res['stream_s'] + res['features_s']:.1f}s")
+            print(f"  → {res['output_path']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build per-city H3 feature datasets.")
+    parser.add_argument("configs", nargs="*",
+                        help="city config files (default: every cities/*.json)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parallel city processes (default: one per city, up to CPU count)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="raw rows per streamed batch")
+    args = parser.parse_args()
+
+    configs = args.configs or sorted(glob.glob(os.path.join(CITY_DIR, "*.json")))
+    run_cities(configs, workers=args.workers, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# =============================================================================
+# OFFENSE TAXONOMY — memoized description → category classification
+#
+# A city's offense classifier is an ordered list of keyword rules (see the
+# "classifier" block of cities/*.json): the first rule with a matching
+# keyword decides the category, otherwise the default ("OTHERS") applies.
+#   match = "contains"  keyword is a substring of the description
+#                       (Boston / LA keyword cascades)
+#   match = "exact"     description equals a keyword (Chicago primary types)
+#
+# Each rule is compiled once into a single regex / set lookup, and a column
+# of descriptions is classified through its unique values only — there are
+# a few hundred distinct descriptions against millions of incidents — then
+# broadcast back via categorical codes. Resolved descriptions are memoized
+# across chunks and can be persisted to / reloaded from a JSON table.
+#
+# Usage:
+#   tax = OffenseTaxonomy.from_config("cities/boston.json")
+#   df["CRIME_CATEGORY"] = tax.classify_series(df["OFFENSE_DESCRIPTION"])
+#   tax.save("FeaturesDataset/taxonomy/boston.json")
+# =============================================================================
+
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+
+class OffenseTaxonomy:
+    """Compiled keyword cascade with a description → category memo."""
+
+    def __init__(self, rules, match="contains", default="OTHERS", keep=None):
+        if match not in ("contains", "exact"):
+            raise ValueError(f"Unknown match mode: {match!r}")
+        self.rules = [{"category": r["category"], "keywords": list(r["keywords"])}
+                      for r in rules]
+        self.match = match
+        self.default = default
+        self.keep = list(keep) if keep is not None else None
+        self.categories = list(dict.fromkeys(
+            [r["category"] for r in self.rules] + [default]
+        ))
+
+        if match == "exact":
+            self._matchers = [frozenset(k.upper() for k in r["keywords"]).__contains__
+                              for r in self.rules]
+        else:
+            # Longest keywords first so the alternation never stops early
+            self._matchers = [
+                re.compile("|".join(
+                    re.escape(k.upper())
+                    for k in sorted(r["keywords"], key=len, reverse=True)
+                )).search
+                for r in self.rules
+            ]
+        self._memo = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from a city config path, config dict or its classifier block."""
+        if isinstance(config, str):
+            with open(config) as f:
+                config = json.load(f)
+        classifier = config.get("classifier", config)
+        return cls(classifier["rules"], match=classifier.get("match", "contains"),
+                   default=classifier.get("default", "OTHERS"),
+                   keep=classifier.get("keep"))
+
+    @property
+    def rules_hash(self) -> str:
+        """Fingerprint of the rules; a persisted table is only reused if it matches."""
+        spec = json.dumps([self.match, self.default, self.rules], sort_keys=True)
+        return hashlib.sha1(spec.encode()).hexdigest()[:16]
+
+    # ── Classification ───────────────────────────────────────────────────────
+    def classify(self, desc) -> str:
+        """Category of a single description (memoized)."""
+        key = str(desc).upper()
+        category = self._memo.get(key)
+        if category is None:
+            category = self.default
+            for category_name, matcher in zip((r["category"] for r in self.rules),
+                                              self._matchers):
+                if matcher(key):
+                    category = category_name
+                    break
+            self._memo[key] = category
+        return category
+
+    def classify_series(self, descriptions: pd.Series) -> pd.Series:
+        """
+        Categorical Series of categories, aligned with `descriptions`.
+        Only the distinct descriptions are classified.
+        """
+        codes, uniques = pd.factorize(descriptions, use_na_sentinel=True)
+        lookup = {c: i for i, c in enumerate(self.categories)}
+        unique_codes = np.array(
+            [lookup[self.classify(u)] for u in uniques] + [lookup[self.classify(np.nan)]],
+            dtype=np.int16,
+        )
+        # sentinel -1 (missing description) indexes the trailing NaN entry
+        cat = pd.Categorical.from_codes(unique_codes[codes], categories=self.categories)
+        return pd.Series(cat, index=descriptions.index, name="crime_category")
+
+    def keep_mask(self, descriptions: pd.Series) -> np.ndarray:
+        """Boolean mask of incidents whose category is in `keep`."""
+        categories = self.classify_series(descriptions)
+        if self.keep is None:
+            return np.ones(len(categories), dtype=bool)
+        return categories.isin(self.keep).to_numpy()
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+    def table(self) -> pd.DataFrame:
+        """Resolved description → category table, sorted by description."""
+        return pd.DataFrame(sorted(self._memo.items()), columns=["description", "category"])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "rules_hash": self.rules_hash,
+                "match": self.match,
+                "table": dict(sorted(self._memo.items())),
+            }, f, indent=1, ensure_ascii=False)
+
+    def load(self, path) -> bool:
+        """Seed the memo from a saved table; ignored if the rules changed."""
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            saved = json.load(f)
+        if saved.get("rules_hash") != self.rules_hash:
+            print(f"⚠ {os.path.basename(path)}: rules changed — taxonomy table rebuilt")
+            return False
+        self._memo.update(saved["table"])
+        return True
@@ -37,10 +37,30 @@ API_BASE = (
     or os.environ.get("CRIME_API_URL", "https://chicago-crime-api.onrender.com")
 )
 
-API_LIVE = "https://data.cityofchicago.org/resource/f6bk-yv3r.json"
-API_BEATS = "https://data.cityofchicago.org/resource/n9it-hstw.json?$limit=5000"
-API_COMMUNITY = "https://data.cityofchicago.org/resource/igwz-8jzy.json?$limit=100"
+# City data portal; point at ML/LoadTest/soda_stub.py to run offline
+SODA_BASE = (
+    st.secrets.get("SODA_BASE_URL", None)
+    or os.environ.get("SODA_BASE_URL", "https://data.cityofchicago.org")
+).rstrip("/")
+
+API_LIVE = f"{SODA_BASE}/resource/f6bk-yv3r.json"
+API_BEATS = f"{SODA_BASE}/resource/n9it-hstw.json?$limit=5000"
+API_COMMUNITY = f"{SODA_BASE}/resource/igwz-8jzy.json?$limit=100"
 H3_RES = 8
+SHIFTS = ["morning_noon", "afternoon_night", "overnight"]
+
+FEATURE_LABELS = {
+    "is_afternoon_night": "Afternoon/night shift",
+    "is_overnight": "Overnight shift",
+    "lag_1d": "Crimes yesterday",
+    "rolling_7d_mean_norm": "7-day trend",
+    "rolling_30d_mean_norm": "30-day trend",
+    "tile_crime_density_percentile": "Crime density rank",
+    "tile_momentum": "Recent momentum",
+    "day_sin": "Day of week", "day_cos": "Day of week",
+    "month_sin": "Season", "month_cos": "Season",
+    "neighbor_lag_1d_norm": "Nearby crimes yesterday",
+}
 
 
 # =============================================================================
@@ -153,7 +173,7 @@ def get_pr_at_threshold(threshold):
 
 @st.cache_data(ttl=300)
 def fetch_live_lag(target_date):
-    """Fetch recent violent crimes for fresh lag_1d."""
+    """Yesterday's violent crimes per tile and shift (shift dates as in training)."""
     yesterday = target_date - timedelta(days=1)
     start = target_date - timedelta(days=2)
     params = {
@@ -179,8 +199,20 @@ def fetch_live_lag(target_date):
         df["h3_address"] = df.apply(
             lambda r: h3.latlng_to_cell(r["latitude"], r["longitude"], H3_RES), axis=1
         )
-        yest_df = df[df["Date"].dt.date == yesterday]
-        lag_counts = yest_df.groupby("h3_address").size().reset_index(name="lag_1d")
+        # Shifts 06–13 / 14–21 / 22–05; pre-06:00 crimes belong to the previous day
+        hour = df["Date"].dt.hour
+        df["shift"] = np.select([hour.between(6, 13), hour.between(14, 21)],
+                                SHIFTS[:2], default=SHIFTS[2])
+        df["shift_date"] = (df["Date"] - pd.to_timedelta((hour < 6).astype(int), unit="D")).dt.date
+        yest_df = df[df["shift_date"] == yesterday]
+        if yest_df.empty:
+            return None
+        lag_counts = (
+            yest_df.groupby(["h3_address", "shift"]).size()
+            .unstack(fill_value=0)
+            .reindex(columns=SHIFTS, fill_value=0)
+            .reset_index()
+        )
         return lag_counts
     except Exception:
         return None
@@ -189,19 +221,24 @@ def fetch_live_lag(target_date):
 # =============================================================================
 # PREDICTION (via API)
 # =============================================================================
-def predict_tiles(meta, query_date, shift, threshold, override_tiles=None):
+def live_lag_payload(override_tiles):
+    """Per-tile, per-shift counts → {h3_address: {shift: count}} for the API."""
+    counts = override_tiles.set_index("h3_address")[SHIFTS].astype(float)
+    return counts.to_dict(orient="index")
+
+
+def predict_tiles(meta, query_date, shift, threshold, override_tiles=None, explain=False):
     """Call the FastAPI backend for predictions."""
     payload = {
         "query_date": str(query_date),
         "shift": shift,
         "threshold": threshold,
+        "explain": explain,   # top contributing features per flagged tile (map tooltips)
     }
 
     # Convert live lag DataFrame to dict for the API
     if override_tiles is not None and len(override_tiles) > 0:
-        payload["live_lag"] = dict(
-            zip(override_tiles["h3_address"], override_tiles["lag_1d"].astype(float))
-        )
+        payload["live_lag"] = live_lag_payload(override_tiles)
 
     resp = requests.post(f"{API_BASE}/predict", json=payload, timeout=60)
     resp.raise_for_status()
@@ -211,9 +248,42 @@ def predict_tiles(meta, query_date, shift, threshold, override_tiles=None):
     return results.sort_values("crime_probability", ascending=False).reset_index(drop=True)
 
 
+@st.cache_data(ttl=300, show_spinner=False)
+def allocate_units(query_date, shift, threshold, units, tile_district, radius, solver,
+                   override_tiles=None):
+    """Call the FastAPI backend to assign patrol units to flagged tile clusters."""
+    payload = {
+        "query_date": str(query_date),
+        "shift": shift,
+        "threshold": threshold,
+        "units": units,
+        "tile_district": tile_district,
+        "radius": radius,
+        "solver": solver,
+    }
+    if override_tiles is not None and len(override_tiles) > 0:
+        payload["live_lag"] = live_lag_payload(override_tiles)
+
+    resp = requests.post(f"{API_BASE}/allocate", json=payload, timeout=60)
+    resp.raise_for_status()
+    return resp.json()
+
+
 # =============================================================================
 # MAP BUILDER (pure Folium + JSON, no geopandas)
 # =============================================================================
+def explanation_html(explanation):
+    """Tooltip lines for the top contributing features of a flagged tile."""
+    if not isinstance(explanation, list) or not explanation:
+        return ""
+    lines = [
+        f"{FEATURE_LABELS.get(f['feature'], f['feature'])} "
+        f"({f['contribution'] * 100:+.1f} pts)"
+        for f in explanation
+    ]
+    return "<br><b>Why flagged:</b><br>" + "<br>".join(f"&nbsp;• {line}" for line in lines)
+
+
 def prob_to_hex(prob, threshold=0.15):
     if prob < threshold:
         return "#A8D5A2"
@@ -327,7 +397,8 @@ def build_map(
             f"<b>Community:</b> {community}<br>"
             f"<b>Risk:</b> {tier}<br>"
             f"<b>Prob:</b> {prob:.1%}"
-            f"</div>"
+            + explanation_html(row.get("explanation"))
+            + "</div>"
         )
         folium.Polygon(
             locations=[(lat, lon) for lat, lon in boundary],
@@ -480,6 +551,15 @@ with st.sidebar:
             "close to being flagged but haven't crossed the cutoff yet."
         ),
     )
+    explain = st.checkbox(
+        "Explain flagged tiles",
+        value=False,
+        help=(
+            "Adds the top contributing features of each flagged tile to its "
+            "map tooltip. The backend computes them per date and shift, so "
+            "the first prediction of each scenario takes longer."
+        ),
+    )
 
     st.markdown("---")
     st.markdown("### 🎨 Tile Opacity")
@@ -535,7 +615,7 @@ if use_live:
         st.warning("No recent violent crimes in API — using baseline lag values.")
 
 with st.spinner("Running prediction …"):
-    results = predict_tiles(meta, query_date, shift, threshold, override)
+    results = predict_tiles(meta, query_date, shift, threshold, override, explain=explain)
 
 # ── Metrics ───────────────────────────────────────────────────────────────
 n_total = len(results)
@@ -599,6 +679,58 @@ with tab_table:
         file_name=f"patrol_briefing_{query_date}_{shift}.csv", mime="text/csv",
     )
 
+    st.markdown("---")
+    st.markdown("### 🚓 Patrol Allocation")
+    st.caption(
+        "Assigns units to clusters of flagged tiles to maximise the expected risk covered. "
+        "A unit covers every tile within the travel radius of its centre tile, "
+        "and is centred inside its own district."
+    )
+    a1, a2, a3 = st.columns(3)
+    units_per_district = a1.number_input("Units per district", min_value=0, max_value=20, value=2)
+    radius = a2.selectbox(
+        "Travel radius", options=[0, 1, 2, 3], index=1,
+        format_func=lambda r: "Own tile only" if r == 0 else f"{r} tile{'s' if r > 1 else ''}",
+    )
+    solver = a3.selectbox(
+        "Solver", options=["greedy", "exact"],
+        format_func=lambda s: {"greedy": "Fast (greedy)", "exact": "Exact (MILP)"}[s],
+    )
+
+    tile_district = {h: d for h, (_, d) in tile_beat_map.items() if d}
+    districts = all_districts if district_filter == "ALL" else [district_filter]
+    units = {d: int(units_per_district) for d in districts}
+    try:
+        plan = allocate_units(query_date, shift, threshold, units, tile_district,
+                              radius, solver, override)
+    except requests.RequestException as e:
+        st.warning(f"Allocation unavailable: {e}")
+        plan = None
+
+    if plan is not None:
+        p1, p2, p3, p4 = st.columns(4)
+        p1.metric("Units Deployed", f"{len(plan['assignments']):,}")
+        p2.metric("Risk Covered", f"{plan['coverage']:.0%}")
+        p3.metric("Flagged Tiles Covered", f"{plan['covered_count']:,} / {plan['flagged_count']:,}")
+        p4.metric("Solve Time", f"{plan['solve_ms']:.0f} ms",
+                  delta=plan["solver"] + (" (optimal)" if plan.get("optimal") else ""),
+                  delta_color="off")
+        if plan["assignments"]:
+            alloc_df = pd.DataFrame(plan["assignments"])
+            alloc_df["beat"] = alloc_df["center_h3"].map(lambda h: tile_beat_map.get(h, ("?", ""))[0])
+            alloc_df["tiles"] = alloc_df["covered_tiles"].map(len)
+            alloc_df = alloc_df[["unit_id", "district", "beat", "center_h3", "tiles", "covered_risk"]]
+            st.dataframe(alloc_df, use_container_width=True, hide_index=True)
+            st.download_button(
+                "📥 Download Unit Assignments (CSV)",
+                data=pd.DataFrame(plan["assignments"]).explode("covered_tiles").to_csv(index=False),
+                file_name=f"patrol_allocation_{query_date}_{shift}.csv", mime="text/csv",
+            )
+        if plan["idle_units"]:
+            st.caption("Idle units (no flagged tiles left in reach): " + ", ".join(
+                f"District {d}: {n}" for d, n in plan["idle_units"].items()
+            ))
+
 with tab_charts:
     import matplotlib.pyplot as plt
 
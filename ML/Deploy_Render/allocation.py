@@ -0,0 +1,306 @@
+# =============================================================================
+# PATROL ALLOCATION — assign units to clusters of flagged tiles
+#
+# Given the /predict probabilities and a number of units per district, pick
+# one H3 tile per unit as its patrol centre. A unit covers every tile within
+# `radius` grid steps of its centre (radius 1 = centre + 6 neighbours), and
+# may only be centred on a tile of its own district. The objective is the
+# expected covered risk: the summed probability of the flagged tiles
+# (probability ≥ threshold) covered by at least one unit.
+#
+# Solvers:
+#   greedy — repeatedly place the unit with the largest marginal covered
+#            risk; gains are updated incrementally, only around the tiles
+#            newly covered (1/2-approximation under per-district limits,
+#            a few milliseconds city-wide)
+#   exact  — the max-coverage integer program solved with scipy's HiGHS
+#            (scipy.optimize.milp) under a time limit; falls back to the
+#            greedy answer if scipy is missing or no solution is found
+#
+# Tile → district mapping: a `district` column of tile_baseline.csv, else
+# deployment/tile_district.json (written by `python allocation.py` from the
+# police beat boundaries). A request may pass its own mapping; without any,
+# only city-wide units ({"ALL": n}) can be placed.
+#
+# Usage:
+#   allocator = PatrolAllocator(baselines["h3_address"].tolist(),
+#                               load_tile_district(DEPLOY_DIR, baselines))
+#   plan = allocator.allocate(probs, threshold, units={"11": 3, "7": 2})
+# =============================================================================
+
+import json
+import os
+import time
+
+import numpy as np
+
+MAX_RADIUS = 3
+CITY_WIDE = "ALL"
+TILE_DISTRICT_FILE = "tile_district.json"
+BEATS_URL = "https://data.cityofchicago.org/resource/n9it-hstw.json?$limit=5000"
+
+
+# ── Tile → district mapping ──────────────────────────────────────────────────
+def tile_district_from_beats(h3_addresses, beats) -> dict:
+    """{h3_address: district} by tile centroid in the police beat polygons (SODA rows)."""
+    import h3
+    from shapely.geometry import Point, shape
+
+    polys = [(shape(b["the_geom"]), str(b["district"])) for b in beats
+             if isinstance(b.get("the_geom"), dict) and b.get("district")]
+    tile_district = {}
+    for h in h3_addresses:
+        lat, lon = h3.cell_to_latlng(h)
+        pt = Point(lon, lat)
+        district = next((d for geom, d in polys if geom.contains(pt)), None)
+        if district is not None:
+            tile_district[h] = district
+    return tile_district
+
+
+def load_tile_district(deploy_dir, baselines):
+    """The deployed {h3_address: district}, or None (with a warning) if absent."""
+    if "district" in baselines.columns:
+        known = baselines.dropna(subset=["district"])
+        districts = known["district"]
+        if districts.dtype.kind == "f":
+            districts = districts.astype(int)
+        tile_district = dict(zip(known["h3_address"], districts.astype(str)))
+    else:
+        path = os.path.join(deploy_dir, TILE_DISTRICT_FILE)
+        if not os.path.exists(path):
+            print(f"⚠ {TILE_DISTRICT_FILE} not found — /allocate only places city-wide units")
+            return None
+        with open(path) as f:
+            tile_district = json.load(f)
+    print(f"✓ Tile districts loaded — {len(tile_district)} tiles, "
+          f"{len(set(tile_district.values()))} districts")
+    return tile_district
+
+
+def district_units(units) -> list:
+    """Districts with at least one unit, other than the city-wide pool."""
+    return [d for d, v in units.items() if int(v) > 0 and d != CITY_WIDE]
+
+
+# ── Grid adjacency ───────────────────────────────────────────────────────────
+def disk_index(h3_addresses, radius) -> np.ndarray:
+    """(n_tiles, 3r(r+1)+1) indices of the tiles within `radius`; n_tiles = none."""
+    import h3
+
+    pos = {h: i for i, h in enumerate(h3_addresses)}
+    n = len(h3_addresses)
+    disk = np.full((n, 3 * radius * (radius + 1) + 1), n, dtype=np.int32)
+    for i, h in enumerate(h3_addresses):
+        cells = [pos[c] for c in h3.grid_disk(h, radius) if c in pos]
+        disk[i, :len(cells)] = cells
+    return disk
+
+
+class PatrolAllocator:
+    """Max-coverage unit placement over the deployed tile grid."""
+
+    def __init__(self, h3_addresses, tile_district=None):
+        self.h3_addresses = list(h3_addresses)
+        self.n_tiles = len(self.h3_addresses)
+        self.tile_district = tile_district
+        self._disks = {}
+
+    def disk(self, radius) -> np.ndarray:
+        if radius not in self._disks:
+            self._disks[radius] = disk_index(self.h3_addresses, radius)
+        return self._disks[radius]
+
+    # ── Problem set-up ───────────────────────────────────────────────────────
+    def _districts(self, units, tile_district):
+        """District names, per-tile district code (-1 = none) and unit limits."""
+        if tile_district is None:
+            if district_units(units):
+                raise ValueError(
+                    "Per-district units need a tile → district mapping; "
+                    f"pass tile_district or use units={{'{CITY_WIDE}': n}}"
+                )
+            names = [CITY_WIDE]
+            codes = np.zeros(self.n_tiles, dtype=np.int32)
+            limits = np.array([sum(int(v) for v in units.values())])
+            return names, codes, limits
+        names = [str(d) for d, v in units.items() if int(v) > 0]
+        lookup = {d: i for i, d in enumerate(names)}
+        codes = np.array(
+            [lookup.get(str(tile_district.get(h, "")), -1) for h in self.h3_addresses],
+            dtype=np.int32,
+        )
+        limits = np.array([int(units[d]) for d in units if int(units[d]) > 0], dtype=np.int64)
+        return names, codes, limits
+
+    # ── Solvers ──────────────────────────────────────────────────────────────
+    def _greedy(self, weights, disk, codes, limits) -> list:
+        """Centres in pick order, by largest marginal covered risk."""
+        n, m = disk.shape
+        w = np.append(weights, 0.0)
+        gains = w[disk].sum(axis=1)
+        gains[codes < 0] = -1.0
+        remaining = limits.copy()
+        chosen = []
+        while remaining.sum() > 0:
+            c = int(np.argmax(gains))
+            if gains[c] <= 1e-12:
+                break
+            chosen.append(c)
+            remaining[codes[c]] -= 1
+            if remaining[codes[c]] == 0:
+                gains[codes == codes[c]] = -1.0
+
+            # Tiles newly covered stop contributing to every centre covering them
+            new = disk[c][w[disk[c]] > 0]
+            covering = disk[new]
+            valid = covering < n
+            np.subtract.at(gains, covering[valid], np.repeat(w[new], m)[valid.ravel()])
+            w[new] = 0.0
+            gains[chosen] = -1.0
+        return chosen
+
+    def _exact(self, weights, disk, codes, limits, time_limit_ms):
+        """(centres, proven optimal) of the max-coverage MILP; None if unsolved."""
+        from scipy.optimize import Bounds, LinearConstraint, milp
+        from scipy.sparse import coo_matrix, vstack
+
+        n = self.n_tiles
+        risky = np.flatnonzero(weights > 0)
+        w = np.append(weights, 0.0)
+        centres = np.flatnonzero((codes >= 0) & (w[disk].sum(axis=1) > 0))
+        if len(centres) == 0 or len(risky) == 0:
+            return [], True
+        nx, ny = len(centres), len(risky)
+        y_pos = np.full(n + 1, -1)
+        y_pos[risky] = np.arange(ny)
+
+        # coverage: y_t - Σ x_c ≤ 0 over the centres c whose disk holds t
+        rows = y_pos[disk[centres]].ravel()
+        cols = np.repeat(np.arange(nx), disk.shape[1])
+        keep = rows >= 0
+        cover = coo_matrix(
+            (np.concatenate([-np.ones(keep.sum()), np.ones(ny)]),
+             (np.concatenate([rows[keep], np.arange(ny)]),
+              np.concatenate([cols[keep], nx + np.arange(ny)]))),
+            shape=(ny, nx + ny),
+        )
+        # district limits: Σ x_c ≤ units_d
+        limit = coo_matrix(
+            (np.ones(nx), (codes[centres], np.arange(nx))),
+            shape=(len(limits), nx + ny),
+        )
+        res = milp(
+            c=np.concatenate([np.zeros(nx), -weights[risky]]),
+            constraints=[
+                LinearConstraint(vstack([cover, limit]),
+                                 -np.inf, np.concatenate([np.zeros(ny), limits])),
+            ],
+            integrality=np.concatenate([np.ones(nx), np.zeros(ny)]),
+            bounds=Bounds(0, 1),
+            options={"time_limit": time_limit_ms / 1000.0},
+        )
+        if res.x is None:
+            return None
+        picked = centres[res.x[:nx] > 0.5]
+        # Report centres in descending order of their own covered risk
+        order = np.argsort(-w[disk[picked]].sum(axis=1), kind="stable")
+        return picked[order].tolist(), res.status == 0
+
+    # ── Entry point ──────────────────────────────────────────────────────────
+    def allocate(self, probs, threshold, units, tile_district=None, radius=1,
+                 solver="greedy", time_limit_ms=800) -> dict:
+        """
+        probs         : (n_tiles,) probabilities in tile_baseline.csv order
+        units         : {district: number of units}
+        tile_district : {h3_address: district}; None = the allocator's own
+                        mapping (units must be {"ALL": n} if it has none)
+        """
+        if not 0 <= radius <= MAX_RADIUS:
+            raise ValueError(f"radius must be between 0 and {MAX_RADIUS}")
+        if solver not in ("greedy", "exact"):
+            raise ValueError(f"Unknown solver: {solver!r}")
+        t0 = time.perf_counter()
+
+        probs = np.asarray(probs, dtype=np.float64)
+        weights = np.where(probs >= threshold, probs, 0.0)
+        disk = self.disk(radius)
+        if tile_district is None:
+            tile_district = self.tile_district
+        names, codes, limits = self._districts(units, tile_district)
+
+        used, optimal = "greedy", None
+        chosen = None
+        if solver == "exact":
+            try:
+                found = self._exact(weights, disk, codes, limits, time_limit_ms)
+            except ImportError:
+                found = None
+            if found is not None:
+                (chosen, optimal), used = found, "exact"
+        if chosen is None:
+            chosen = self._greedy(weights, disk, codes, limits)
+
+        # Each covered tile is credited to the first unit that reaches it
+        w = np.append(weights, 0.0)
+        taken = np.zeros(self.n_tiles + 1, dtype=bool)
+        taken[self.n_tiles] = True
+        per_district = {}
+        assignments = []
+        for c in chosen:
+            tiles = [t for t in disk[c] if not taken[t] and w[t] > 0]
+            taken[tiles] = True
+            district = names[codes[c]]
+            per_district[district] = per_district.get(district, 0) + 1
+            assignments.append({
+                "unit_id": f"{district}-{per_district[district]}",
+                "district": district,
+                "center_h3": self.h3_addresses[c],
+                "covered_tiles": [self.h3_addresses[t] for t in tiles],
+                "covered_risk": round(float(w[tiles].sum()), 4),
+            })
+
+        covered = float(weights[taken[:self.n_tiles]].sum())
+        total = float(weights.sum())
+        idle = {d: int(limits[i]) - per_district.get(d, 0) for i, d in enumerate(names)}
+        return {
+            "assignments": assignments,
+            "covered_risk": round(covered, 4),
+            "total_risk": round(total, 4),
+            "coverage": round(covered / total, 4) if total > 0 else 0.0,
+            "flagged_count": int((weights > 0).sum()),
+            "covered_count": int(sum(len(a["covered_tiles"]) for a in assignments)),
+            "idle_units": {d: n for d, n in idle.items() if n > 0},
+            "solver": used,
+            "optimal": optimal,
+            "solve_ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(
+        description=f"Write deployment/{TILE_DISTRICT_FILE} from the police beat boundaries.")
+    parser.add_argument("--beats", default=BEATS_URL,
+                        help="beat boundaries: a SODA URL or a saved JSON file")
+    args = parser.parse_args()
+
+    deploy_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "deployment")
+    if os.path.exists(args.beats):
+        with open(args.beats) as f:
+            beats = json.load(f)
+    else:
+        from urllib.request import urlopen
+        with urlopen(args.beats, timeout=60) as resp:
+            beats = json.load(resp)
+    h3_addresses = pd.read_csv(os.path.join(deploy_dir, "tile_baseline.csv"),
+                               usecols=["h3_address"])["h3_address"].tolist()
+    mapping = tile_district_from_beats(h3_addresses, beats)
+    path = os.path.join(deploy_dir, TILE_DISTRICT_FILE)
+    with open(path, "w") as f:
+        json.dump(mapping, f, indent=1, sort_keys=True)
+    print(f"✓ {len(mapping):,} of {len(h3_addresses):,} tiles mapped to "
+          f"{len(set(mapping.values()))} districts → {path}")
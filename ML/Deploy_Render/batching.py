@@ -0,0 +1,140 @@
+# =============================================================================
+# REQUEST COALESCING — micro-batch concurrent /predict calls
+#
+# Requests that arrive within a short window are drained together and
+# scored as one stacked predict_proba call in a worker process. At most
+# `pool_size` batches are in flight; while every worker is busy new requests
+# keep queueing, so batches grow exactly when load is highest.
+# =============================================================================
+
+import asyncio
+import time
+
+
+class PredictBatcher:
+    """
+    Collects ScoreSpecs from concurrent requests and dispatches them in
+    batches to `executor` via `score_fn(list_of_specs) -> list_of_results`.
+    """
+
+    def __init__(self, executor, score_fn, window_ms=5.0, max_batch=32, pool_size=1):
+        self.executor = executor
+        self.score_fn = score_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.pool_size = pool_size
+
+        self._pending = []           # [(spec, future, enqueued_at), ...]
+        self._arrived = None         # set when _pending becomes non-empty
+        self._full = None            # set when _pending reaches max_batch
+        self._slots = None           # bounds in-flight batches to pool_size
+        self._task = None
+
+        self._stats = {
+            "requests_total": 0,
+            "batches_total": 0,
+            "errors_total": 0,
+            "max_queue_depth": 0,
+            "max_batch_size": 0,
+            "in_flight": 0,
+            "wait_ms_total": 0.0,
+            "score_ms_total": 0.0,
+        }
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+    def start(self):
+        self._arrived = asyncio.Event()
+        self._full = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.pool_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for _, fut, _ in self._pending:
+            if not fut.done():
+                fut.cancel()
+        self._pending = []
+
+    # ── Public API ───────────────────────────────────────────────────────────
+    async def submit(self, spec):
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((spec, fut, time.perf_counter()))
+        self._stats["requests_total"] += 1
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._pending))
+        self._arrived.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await fut
+
+    def metrics(self) -> dict:
+        s = self._stats
+        batches = max(s["batches_total"], 1)
+        dispatched = s["requests_total"] - len(self._pending)
+        return {
+            "mode": "pool",
+            "pool_size": self.pool_size,
+            "batch_window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "queue_depth": len(self._pending),
+            "max_queue_depth": s["max_queue_depth"],
+            "in_flight_batches": s["in_flight"],
+            "requests_total": s["requests_total"],
+            "batches_total": s["batches_total"],
+            "errors_total": s["errors_total"],
+            "avg_batch_size": round(dispatched / batches, 2),
+            "max_batch_size": s["max_batch_size"],
+            "avg_queue_wait_ms": round(s["wait_ms_total"] / max(dispatched, 1), 2),
+            "avg_batch_score_ms": round(s["score_ms_total"] / batches, 2),
+        }
+
+    # ── Internals ────────────────────────────────────────────────────────────
+    async def _run(self):
+        while True:
+            await self._arrived.wait()
+            # Hold the window open for more arrivals unless the batch fills up
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            # Wait for a free worker; requests keep accumulating meanwhile
+            await self._slots.acquire()
+
+            batch = self._pending[:self.max_batch]
+            self._pending = self._pending[self.max_batch:]
+            if len(self._pending) < self.max_batch:
+                self._full.clear()
+            if not self._pending:
+                self._arrived.clear()
+
+            asyncio.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        s = self._stats
+        now = time.perf_counter()
+        s["batches_total"] += 1
+        s["in_flight"] += 1
+        s["max_batch_size"] = max(s["max_batch_size"], len(batch))
+        s["wait_ms_total"] += sum((now - t) * 1000.0 for _, _, t in batch)
+
+        specs = [spec for spec, _, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.score_fn, specs)
+        except Exception as e:
+            s["errors_total"] += 1
+            for _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+        else:
+            for (_, fut, _), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
+        finally:
+            s["score_ms_total"] += (time.perf_counter() - now) * 1000.0
+            s["in_flight"] -= 1
+            self._slots.release()
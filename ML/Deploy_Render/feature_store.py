@@ -0,0 +1,259 @@
+# =============================================================================
+# FEATURE STORE — point-in-time per-tile features by (date, shift, tile)
+#
+# tile_baseline.csv is one snapshot taken on the last training day, so
+# without the store every query date sees the same rolling / momentum /
+# percentile values. The store keeps the engineered features of EVERY
+# shift-date in the training window, exactly as the model saw them:
+#
+#   deployment/feature_store/
+#     <feature>.npy   (n_dates, 3, n_tiles) float32, one file per base
+#                     feature column, memory-mapped; [day, shift] is one
+#                     contiguous row of all tiles
+#     latest.npy      (3, n_tiles, n_base_cols) features of the first day
+#                     after the window, from the live state
+#     index.json      start / end date, shifts, columns, tile fingerprint
+#
+# Lookup is positional — day = query_date − start_date, shift index, tile
+# order of tile_baseline.csv — so any as-of read touches one row per column.
+#   query_date in the window   → that day's features (exact replay)
+#   query_date after the window → latest snapshot
+#   query_date before the window → None (caller falls back to the baseline)
+# Cells the training table never had (a tile's cold-start days) are NaN
+# and filled from the fallback matrix. Since lag_1d is yesterday's count,
+# the store also holds the full count history; live_kernel_as_of rebuilds
+# the live state of any past date from it.
+#
+# float32 loses nothing the model uses: XGBoost splits on float32 inputs.
+#
+# Usage:
+#   build_feature_store(final_df, h3_addresses, base_cols, deploy_dir, live_state)
+#   store = FeatureStore.from_deploy_dir(deploy_dir, baselines, base_cols)
+#   base, source = store.lookup("2025-12-01", "overnight", fallback=base_matrix)
+#   store.live_kernel_as_of("2025-12-01")   # live_lag on a past date
+#   store.tile_history("882664c1a9fffff", shift="overnight")   # analysts
+# =============================================================================
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from live_features import (
+    HALFLIFE_FAST, HALFLIFE_SLOW, SHIFT_ORDER, WINDOW, LiveFeatureKernel, _decay,
+    neighbor_index,
+)
+
+STORE_DIR = "feature_store"
+INDEX_FILE = "index.json"
+LATEST_FILE = "latest.npy"
+KERNEL_CACHE_SIZE = 8
+
+
+def _tiles_digest(h3_addresses) -> str:
+    return hashlib.sha1("\n".join(h3_addresses).encode()).hexdigest()[:16]
+
+
+# ── Builder (retrain notebook) ───────────────────────────────────────────────
+def build_feature_store(final_df, h3_addresses, base_cols, deploy_dir, live_state=None) -> str:
+    """
+    Write the store from the engineered training table.
+
+    final_df     : engineer_features output (h3_address, shift_date, shift,
+                   base feature columns)
+    h3_addresses : tile order of tile_baseline.csv
+    live_state   : build_live_state output, for the latest snapshot
+    """
+    store_dir = os.path.join(deploy_dir, STORE_DIR)
+    os.makedirs(store_dir, exist_ok=True)
+
+    tiles = pd.Index(h3_addresses)
+    shift_dates = pd.to_datetime(final_df["shift_date"])
+    start, end = shift_dates.min().normalize(), shift_dates.max().normalize()
+    n_dates = (end - start).days + 1
+
+    day = (shift_dates.dt.normalize() - start).dt.days.to_numpy()
+    shift = pd.Index(SHIFT_ORDER).get_indexer(final_df["shift"])
+    tile = tiles.get_indexer(final_df["h3_address"])
+    keep = (shift >= 0) & (tile >= 0)
+    day, shift, tile = day[keep], shift[keep], tile[keep]
+
+    for col in base_cols:
+        values = np.full((n_dates, len(SHIFT_ORDER), len(tiles)), np.nan, dtype=np.float32)
+        values[day, shift, tile] = final_df[col].to_numpy(dtype=np.float32)[keep]
+        np.save(os.path.join(store_dir, f"{col}.npy"), values)
+
+    latest_date = None
+    if live_state is not None:
+        kernel = LiveFeatureKernel(live_state, list(tiles), base_cols)
+        latest = np.stack([kernel.current(s) for s in SHIFT_ORDER]).astype(np.float32)
+        np.save(os.path.join(store_dir, LATEST_FILE), latest)
+        latest_date = str((pd.Timestamp(kernel.state_date or end) + pd.Timedelta(days=1)).date())
+
+    index = {
+        "start_date": str(start.date()),
+        "end_date": str(end.date()),
+        "n_dates": n_dates,
+        "shifts": SHIFT_ORDER,
+        "columns": list(base_cols),
+        "n_tiles": len(tiles),
+        "tiles_digest": _tiles_digest(list(tiles)),
+        "latest_date": latest_date,
+    }
+    with open(os.path.join(store_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=2)
+
+    size = sum(os.path.getsize(os.path.join(store_dir, f)) for f in os.listdir(store_dir)) / 1e6
+    print(f"✓ Feature store built — {n_dates:,} days × {len(SHIFT_ORDER)} shifts × "
+          f"{len(tiles):,} tiles × {len(base_cols)} features ({size:.1f} MB) → {store_dir}")
+    return store_dir
+
+
+# ── Reader (API / analysts) ──────────────────────────────────────────────────
+class FeatureStore:
+    """Memory-mapped as-of feature lookup in tile_baseline.csv order."""
+
+    def __init__(self, store_dir, h3_addresses, base_cols):
+        with open(os.path.join(store_dir, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        if self.index["tiles_digest"] != _tiles_digest(list(h3_addresses)):
+            raise ValueError("Feature store tiles do not match tile_baseline.csv")
+        missing = [c for c in base_cols if c not in self.index["columns"]]
+        if missing:
+            raise ValueError(f"Feature store is missing columns: {missing}")
+
+        self.store_dir = store_dir
+        self.h3_addresses = list(h3_addresses)
+        self.base_cols = list(base_cols)
+        self.start = pd.Timestamp(self.index["start_date"])
+        self.n_dates = int(self.index["n_dates"])
+        self.columns = [np.load(os.path.join(store_dir, f"{c}.npy"), mmap_mode="r")
+                        for c in self.base_cols]
+
+        self.latest = None
+        latest_path = os.path.join(store_dir, LATEST_FILE)
+        if os.path.exists(latest_path):
+            latest = np.load(latest_path)
+            order = [self.index["columns"].index(c) for c in self.base_cols]
+            self.latest = latest[:, :, order].astype(np.float64)
+
+        self._neighbors = None
+        self._kernels = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_deploy_dir(cls, deploy_dir, baselines, base_cols):
+        """The deployed store, or None (with a warning) if absent or stale."""
+        store_dir = os.path.join(deploy_dir, STORE_DIR)
+        if not os.path.exists(os.path.join(store_dir, INDEX_FILE)):
+            print("⚠ feature_store/ not found — all query dates use tile_baseline.csv")
+            return None
+        try:
+            store = cls(store_dir, baselines["h3_address"].tolist(), base_cols)
+        except ValueError as e:
+            print(f"⚠ Feature store ignored — {e}")
+            return None
+        print(f"✓ Feature store loaded — {store.index['start_date']} → "
+              f"{store.index['end_date']}, latest {store.index['latest_date']}")
+        return store
+
+    def day_index(self, query_date) -> int:
+        return (pd.Timestamp(query_date).normalize() - self.start).days
+
+    def lookup(self, query_date, shift, fallback=None):
+        """
+        (n_tiles, n_base_cols) as-of features and their source:
+        "history", "latest", or (None, "baseline") outside the store.
+        """
+        d = self.day_index(query_date)
+        s = SHIFT_ORDER.index(shift)
+        if 0 <= d < self.n_dates:
+            base = np.column_stack([col[d, s] for col in self.columns]).astype(np.float64)
+            if fallback is not None:
+                gaps = np.isnan(base)
+                if gaps.any():
+                    base[gaps] = fallback[gaps]
+            return base, "history"
+        if d >= self.n_dates and self.latest is not None:
+            return self.latest[s], "latest"
+        return None, "baseline"
+
+    # ── Live state as of a past date ─────────────────────────────────────────
+    def live_kernel_as_of(self, query_date):
+        """
+        LiveFeatureKernel whose state runs through the day before the fresh
+        day (query_date − 2), rebuilt from the stored lag_1d history: row d
+        of lag_1d holds the counts of day start + d − 1. Lets a past-dated
+        live request roll forward from that date instead of the training
+        end. None when the store cannot cover it (query_date before
+        start + 1 or after end + 1); the caller then uses the deployed state.
+        """
+        e = self.day_index(query_date) - 1   # lag_1d row of the last state day
+        if not 0 <= e < self.n_dates or "lag_1d" not in self.index["columns"]:
+            return None
+        key = str((pd.Timestamp(query_date).normalize() - pd.Timedelta(days=2)).date())
+        with self._lock:
+            kernel = self._kernels.get(key)
+            if kernel is not None:
+                self._kernels.move_to_end(key)
+                return kernel
+
+        lag = np.load(os.path.join(self.store_dir, "lag_1d.npy"), mmap_mode="r")
+        counts = np.nan_to_num(np.asarray(lag[:e + 1], dtype=np.float64))  # (days, 3, tiles)
+        window = np.zeros((len(SHIFT_ORDER), len(self.h3_addresses), WINDOW))
+        recent = counts[-WINDOW:].transpose(1, 2, 0)
+        window[:, :, WINDOW - recent.shape[2]:] = recent
+
+        daily = counts.sum(axis=1)                      # (days, tiles) tile totals
+        age = np.arange(len(daily))[::-1]
+        state = {"window": window}
+        for name, halflife in (("fast", HALFLIFE_FAST), ("slow", HALFLIFE_SLOW)):
+            w = _decay(halflife) ** age
+            state[f"ewma_{name}_num"] = w @ daily
+            state[f"ewma_{name}_den"] = np.full(len(self.h3_addresses), w.sum())
+        state["city_sum"] = daily.sum() / (len(self.h3_addresses) * len(SHIFT_ORDER))
+        state["city_n"] = float(len(daily))
+        if self._neighbors is None:
+            self._neighbors = neighbor_index(self.h3_addresses)
+        state["neighbors"] = self._neighbors
+        state["state_date"] = key
+
+        kernel = LiveFeatureKernel(state, self.h3_addresses, self.base_cols)
+        with self._lock:
+            self._kernels[key] = kernel
+            while len(self._kernels) > KERNEL_CACHE_SIZE:
+                self._kernels.popitem(last=False)
+        return kernel
+
+    def snapshot(self, query_date, shift) -> pd.DataFrame:
+        """All tiles' stored features for one shift-date (NaN = not in training)."""
+        base, _ = self.lookup(query_date, shift)
+        if base is None:
+            raise KeyError(f"{query_date} is outside the feature store")
+        out = pd.DataFrame(base, columns=self.base_cols)
+        out.insert(0, "h3_address", self.h3_addresses)
+        return out
+
+    def tile_history(self, h3_address, shift=None, columns=None) -> pd.DataFrame:
+        """One tile's feature history, one row per (shift_date, shift)."""
+        t = self.h3_addresses.index(h3_address)
+        columns = columns or self.base_cols
+        shifts = [shift] if shift else SHIFT_ORDER
+        dates = pd.date_range(self.start, periods=self.n_dates, freq="D")
+        frames = []
+        for sh in shifts:
+            s = SHIFT_ORDER.index(sh)
+            frame = pd.DataFrame({
+                c: np.asarray(self.columns[self.base_cols.index(c)][:, s, t], dtype=np.float64)
+                for c in columns
+            })
+            frame.insert(0, "shift", sh)
+            frame.insert(0, "shift_date", dates)
+            frames.append(frame)
+        return (pd.concat(frames, ignore_index=True)
+                .sort_values("shift_date", kind="stable")
+                .reset_index(drop=True))
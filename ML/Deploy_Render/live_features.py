@@ -0,0 +1,298 @@
+# =============================================================================
+# LIVE FEATURE KERNEL — recompute tile features from fresh crime counts
+#
+# tile_baseline.csv freezes every feature at the last training day. When the
+# dashboard sends fresh per-tile counts (live_lag) for the day before the
+# query date, this kernel rolls the compact per-tile state forward to that
+# day and recomputes, in one vectorised pass over all tiles:
+#   lag_1d, rolling_7d_mean_norm, rolling_30d_mean_norm, neighbor_lag_1d_norm,
+#   tile_momentum, tile_crime_density_percentile
+#
+# State (deployment/live_state.npz, written by the retrain notebook):
+#   window      (3, n_tiles, 30)  last 30 same-shift counts, oldest → newest
+#   ewma_fast_* / ewma_slow_*     adjust=True EWMA numerator / denominator
+#                                 of daily tile totals (halflife 7 / 30)
+#   city_sum, city_n              expanding mean of the city daily mean
+#   neighbors   (n_tiles, 6)      1-ring neighbour indices, n_tiles = padding
+#   state_date                    last day the state includes
+#
+# Fresh counts are per shift (a whole-day count is split by the tile's
+# recent shift mix). Days between state_date and the fresh day had no
+# counts reported and enter the windows, EWMAs and city baseline as 0;
+# tiles missing from live_lag count as 0 too. Without fresh counts,
+# current(shift) gives the features of the day after the state date (the
+# feature store's "latest" snapshot).
+# =============================================================================
+
+import os
+
+import numpy as np
+
+EPSILON = 1e-6
+SHIFT_ORDER = ["morning_noon", "afternoon_night", "overnight"]
+WINDOW = 30
+HALFLIFE_FAST = 7
+HALFLIFE_SLOW = 30
+
+STATE_FILE = "live_state.npz"
+
+
+def _count(v) -> float:
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return 0.0
+    return v if np.isfinite(v) else 0.0
+
+
+def _decay(halflife):
+    """pandas ewm(halflife=h): alpha = 1 - exp(-ln 2 / h); returns 1 - alpha."""
+    return float(np.exp(-np.log(2) / halflife))
+
+
+# ── Neighbour adjacency ──────────────────────────────────────────────────────
+def neighbor_index(h3_addresses) -> np.ndarray:
+    """(n_tiles, 6) indices of each tile's 1-ring neighbours; n_tiles = none."""
+    import h3
+
+    pos = {h: i for i, h in enumerate(h3_addresses)}
+    n = len(h3_addresses)
+    nbrs = np.full((n, 6), n, dtype=np.int32)
+    for i, h in enumerate(h3_addresses):
+        ring = [pos[c] for c in h3.grid_disk(h, 1) if c != h and c in pos]
+        nbrs[i, :len(ring)] = ring
+    return nbrs
+
+
+# ── State construction (retrain notebook) ────────────────────────────────────
+def build_live_state(final_df, daily_tile, h3_addresses) -> dict:
+    """
+    Build the compact live state from the engineered training table.
+
+    final_df    : tile × shift_date × shift rows with crime_count
+    daily_tile  : tile × shift_date daily totals (engineer_features output)
+    h3_addresses: tile order of tile_baseline.csv
+    """
+    import pandas as pd
+
+    tiles = pd.Index(h3_addresses)
+    dates = np.sort(final_df["shift_date"].unique())
+    last_dates = dates[-WINDOW:]
+
+    # Same-shift windows: last 30 days per (shift, tile)
+    recent = final_df[final_df["shift_date"].isin(last_dates)]
+    window = np.zeros((len(SHIFT_ORDER), len(tiles), WINDOW), dtype=np.float32)
+    for s, shift in enumerate(SHIFT_ORDER):
+        grid = (
+            recent[recent["shift"] == shift]
+            .pivot_table(index="h3_address", columns="shift_date",
+                         values="crime_count", aggfunc="sum")
+            .reindex(index=tiles, columns=last_dates)
+            .fillna(0)
+        )
+        window[s, :, WINDOW - len(last_dates):] = grid.to_numpy(dtype=np.float32)
+
+    # EWMA numerator / denominator of daily totals through the last date
+    daily = (
+        daily_tile.pivot_table(index="h3_address", columns="shift_date",
+                               values="crime_count", aggfunc="sum")
+        .reindex(index=tiles)
+        .fillna(0)
+        .sort_index(axis=1)
+        .to_numpy(dtype=np.float64)
+    )
+    age = np.arange(daily.shape[1])[::-1]
+    state = {"window": window}
+    for name, halflife in (("fast", HALFLIFE_FAST), ("slow", HALFLIFE_SLOW)):
+        w = _decay(halflife) ** age
+        state[f"ewma_{name}_num"] = daily @ w
+        state[f"ewma_{name}_den"] = np.full(len(tiles), w.sum())
+
+    # City daily mean over the full tile × shift grid (daily_tile is built
+    # before the cold-start rows are dropped from final_df)
+    city_daily_mean = (daily_tile.groupby("shift_date")["crime_count"].sum()
+                       / (daily_tile["h3_address"].nunique() * len(SHIFT_ORDER)))
+    state["city_sum"] = np.float64(city_daily_mean.sum())
+    state["city_n"] = np.float64(len(city_daily_mean))
+    state["neighbors"] = neighbor_index(list(tiles))
+    state["state_date"] = np.array(str(pd.Timestamp(dates[-1]).date()))
+    return state
+
+
+def save_live_state(state: dict, deploy_dir):
+    np.savez_compressed(os.path.join(deploy_dir, STATE_FILE), **state)
+
+
+def seed_state_from_baseline(baselines, city_baseline, n_days=3 * 365) -> dict:
+    """
+    Approximate state from tile_baseline.csv alone, for deployments packaged
+    before live_state.npz existed. Windows are filled so their 7- and 30-day
+    means reproduce the baseline; EWMAs are taken as converged and the city
+    baseline as an n_days expanding mean.
+    """
+    n = len(baselines)
+    r7 = baselines["rolling_7d_mean_norm"].to_numpy() * city_baseline
+    r30 = baselines["rolling_30d_mean_norm"].to_numpy() * city_baseline
+    head = np.clip((WINDOW * r30 - 7 * r7) / (WINDOW - 7), 0, None)
+
+    window = np.empty((len(SHIFT_ORDER), n, WINDOW), dtype=np.float32)
+    window[:, :, :WINDOW - 7] = head[:, None]
+    window[:, :, WINDOW - 7:] = r7[:, None]
+
+    slow = len(SHIFT_ORDER) * r30
+    fast = baselines["tile_momentum"].to_numpy() * (slow + EPSILON)
+    state = {"window": window}
+    for name, halflife, level in (("fast", HALFLIFE_FAST, fast), ("slow", HALFLIFE_SLOW, slow)):
+        den = 1.0 / (1.0 - _decay(halflife))
+        state[f"ewma_{name}_num"] = level * den
+        state[f"ewma_{name}_den"] = np.full(n, den)
+    state["city_sum"] = np.float64(city_baseline * n_days)
+    state["city_n"] = np.float64(n_days)
+    state["neighbors"] = neighbor_index(baselines["h3_address"].tolist())
+    state["state_date"] = np.array("")
+    return state
+
+
+# ── Kernel ───────────────────────────────────────────────────────────────────
+class LiveFeatureKernel:
+    """Rolls the per-tile state forward one day and emits the base matrix."""
+
+    def __init__(self, state: dict, h3_addresses, base_cols):
+        self.h3_index = {h: i for i, h in enumerate(h3_addresses)}
+        self.n_tiles = len(h3_addresses)
+        self.base_cols = list(base_cols)
+        self.state_date = str(state.get("state_date", ""))
+
+        window = np.asarray(state["window"], dtype=np.float64)
+        self.last = window[:, :, -1]
+        # tail[s, :, j] = sum of the j most recent same-shift counts, j = 0..30
+        self.tail = np.concatenate(
+            [np.zeros(window.shape[:2] + (1,)), np.cumsum(window[:, :, ::-1], axis=2)], axis=2)
+
+        self.fast_num = np.asarray(state["ewma_fast_num"], dtype=np.float64)
+        self.fast_den = np.asarray(state["ewma_fast_den"], dtype=np.float64)
+        self.slow_num = np.asarray(state["ewma_slow_num"], dtype=np.float64)
+        self.slow_den = np.asarray(state["ewma_slow_den"], dtype=np.float64)
+        self.q_fast = _decay(HALFLIFE_FAST)
+        self.q_slow = _decay(HALFLIFE_SLOW)
+
+        self.city_sum = float(state["city_sum"])
+        self.city_n = float(state["city_n"])
+        self.neighbors = np.asarray(state["neighbors"], dtype=np.intp)
+
+    @classmethod
+    def from_deploy_dir(cls, deploy_dir, baselines, base_cols, meta):
+        path = os.path.join(deploy_dir, STATE_FILE)
+        h3_addresses = baselines["h3_address"].tolist()
+        if os.path.exists(path):
+            with np.load(path) as f:
+                state = {k: f[k] for k in f.files}
+            kernel = cls(state, h3_addresses, base_cols)
+            print(f"✓ Live state loaded — as of {kernel.state_date}")
+        else:
+            city_baseline = meta.get("city_baseline", meta.get("base_rate", 0.07))
+            kernel = cls(seed_state_from_baseline(baselines, city_baseline),
+                         h3_addresses, base_cols)
+            print("⚠ live_state.npz not found — live state seeded from tile_baseline.csv")
+        return kernel
+
+    def fresh_counts(self, live_lag: dict) -> np.ndarray:
+        """
+        live_lag → (3, n_tiles) counts per shift in SHIFT_ORDER; unknown
+        tiles are ignored. Values are either {shift: count} or a whole-day
+        count, which is split over the shifts by the tile's 30-day shift
+        mix (evenly for tiles without recent crime).
+        """
+        fresh = np.zeros((len(SHIFT_ORDER), self.n_tiles))
+        mix = self.tail[:, :, WINDOW]
+        mix = np.divide(mix, mix.sum(axis=0), out=np.full_like(mix, 1.0 / len(SHIFT_ORDER)),
+                        where=mix.sum(axis=0) > 0)
+        for h, v in live_lag.items():
+            i = self.h3_index.get(h)
+            if i is None:
+                continue
+            if isinstance(v, dict):
+                for s, shift in enumerate(SHIFT_ORDER):
+                    fresh[s, i] = _count(v.get(shift, 0))
+            else:
+                fresh[:, i] = _count(v) * mix[:, i]
+        return fresh
+
+    def gap_days(self, query_date) -> int:
+        """
+        Days without counts between state_date and the fresh day (the day
+        before query_date); 0 for a seeded state or a past query date.
+        """
+        if not self.state_date or query_date is None:
+            return 0
+        import pandas as pd
+
+        fresh_day = pd.Timestamp(query_date).normalize() - pd.Timedelta(days=1)
+        return max((fresh_day - pd.Timestamp(self.state_date)).days - 1, 0)
+
+    def apply(self, fresh: np.ndarray, shift, query_date=None) -> np.ndarray:
+        """
+        (3, n_tiles) fresh counts of the day before query_date →
+        (n_tiles, n_base_cols) feature matrix. The state is rolled forward
+        over the days between state_date and the fresh day as zero-count
+        days, then over the fresh day itself.
+        """
+        s = SHIFT_ORDER.index(shift)
+        g = self.gap_days(query_date)
+        total = fresh.sum(axis=0)
+
+        def ewma(num, den, q):
+            # g zero days, then the fresh day (pandas ewm, adjust=True)
+            decay = q ** (g + 1)
+            return (total + decay * num) / ((1.0 - decay) / (1.0 - q) + decay * den)
+
+        city_baseline = (
+            self.city_sum + total.sum() / (self.n_tiles * len(SHIFT_ORDER))
+        ) / (self.city_n + g + 1.0)
+        return self._features(
+            fresh[s],
+            fresh[s] + self.tail[s, :, max(7 - 1 - g, 0)],
+            fresh[s] + self.tail[s, :, max(WINDOW - 1 - g, 0)],
+            ewma(self.fast_num, self.fast_den, self.q_fast),
+            ewma(self.slow_num, self.slow_den, self.q_slow),
+            city_baseline,
+            neighbor_counts=fresh[-1],
+        )
+
+    def current(self, shift) -> np.ndarray:
+        """
+        Feature matrix for the day after state_date, before any fresh counts
+        arrive — the state's own latest day is the lag.
+        """
+        s = SHIFT_ORDER.index(shift)
+        return self._features(
+            self.last[s], self.tail[s, :, 7], self.tail[s, :, WINDOW],
+            self.fast_num / self.fast_den, self.slow_num / self.slow_den,
+            self.city_sum / self.city_n,
+            neighbor_counts=self.last[-1],
+        )
+
+    def _features(self, lag, sum7, sum30, ewma_fast, ewma_slow, city_baseline,
+                  neighbor_counts) -> np.ndarray:
+        # Training's neighbour lag is the neighbours' count in the preceding
+        # shift; the latest known one is the overnight of the fresh day
+        # (exact for morning_noon)
+        norm = 1.0 / (city_baseline + EPSILON)
+        padded = np.append(neighbor_counts, 0.0)
+        neighbor_lag = padded[self.neighbors].sum(axis=1)
+
+        # rank(pct=True), average method for ties
+        ordered = np.sort(ewma_slow)
+        lo = np.searchsorted(ordered, ewma_slow, side="left")
+        hi = np.searchsorted(ordered, ewma_slow, side="right")
+        percentile = (lo + hi + 1) / (2.0 * self.n_tiles)
+
+        feats = {
+            "lag_1d": lag,
+            "rolling_7d_mean_norm": sum7 / 7 * norm,
+            "rolling_30d_mean_norm": sum30 / WINDOW * norm,
+            "neighbor_lag_1d_norm": neighbor_lag * norm,
+            "tile_momentum": ewma_fast / (ewma_slow + EPSILON),
+            "tile_crime_density_percentile": percentile,
+        }
+        return np.column_stack([feats[c] for c in self.base_cols])
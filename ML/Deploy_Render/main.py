@@ -3,35 +3,125 @@
 #
 # Hosts the XGBoost model on Render.com and exposes a /predict endpoint
 # that the Streamlit app calls instead of loading the model locally.
+#
+# Execution modes (env PREDICT_MODE):
+#   inline — score each request on the threadpool (default)
+#   pool   — coalesce concurrent requests arriving within
+#            PREDICT_BATCH_WINDOW_MS into one stacked scoring call, run in a
+#            pool of PREDICT_POOL_SIZE worker processes (one model copy each,
+#            baseline matrix shared via shared memory)
+#
+# Explanations (/predict with explain=true): top contributing features per
+# flagged tile from the boosters' native contributions, computed in the API
+# process and cached per scenario (see explain.py). EXPLAIN_METHOD picks
+# "approx" (default, about one scoring pass) or "exact" TreeSHAP.
+#
+# As-of features: with a deployed feature store (see feature_store.py), a
+# query date inside the training window is scored on that day's stored
+# features and a later date on the latest live-state snapshot; live_lag
+# still takes precedence (rolled forward from the store's state as of the
+# query date when the store covers it), and dates before the window use
+# the baseline.
 # =============================================================================
 
+from concurrent.futures import ProcessPoolExecutor
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+import multiprocessing as mp
 import pandas as pd
 import numpy as np
 import joblib
 import json
 import os
 
+from allocation import (CITY_WIDE, MAX_RADIUS, TILE_DISTRICT_FILE, PatrolAllocator,
+                        district_units, load_tile_district)
+from batching import PredictBatcher
+from explain import ContributionExplainer
+from feature_store import FeatureStore
+from live_features import LiveFeatureKernel
+from scoring import (
+    SHIFT_MAP, ScoreSpec, create_shared_matrix, init_worker, risk_tiers,
+    score_in_worker, score_specs, stack_features, worker_ready,
+)
+
 app = FastAPI(title="Chicago Crime Prediction API", version="1.0.0")
 
 # ── Paths ────────────────────────────────────────────────────────────────────
 DEPLOY_DIR = os.path.join(os.path.dirname(__file__), "deployment")
+MODEL_PATH = os.path.join(DEPLOY_DIR, "xgb_calibrated_pipeline.joblib")
+
+# ── Execution mode ───────────────────────────────────────────────────────────
+PREDICT_MODE = os.environ.get("PREDICT_MODE", "inline")
+BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", "5"))
+POOL_SIZE = int(os.environ.get("PREDICT_POOL_SIZE", str(os.cpu_count() or 1)))
+MAX_BATCH = int(os.environ.get("PREDICT_MAX_BATCH", "32"))
+EXPLAIN_METHOD = os.environ.get("EXPLAIN_METHOD", "approx")
 
 # ── Load model at startup ────────────────────────────────────────────────────
 pipeline = None
 baselines = None
 meta = None
+base_cols = None        # baseline feature columns, in tile_baseline.csv order
+base_matrix = None      # (n_tiles, n_base_cols) float64
+live_kernel = None
+feature_store = None
+allocator = None
+explainer = None
+pool = None
+batcher = None
+shm = None
 
 
 @app.on_event("startup")
-def load_model():
-    global pipeline, baselines, meta
-    pipeline = joblib.load(os.path.join(DEPLOY_DIR, "xgb_calibrated_pipeline.joblib"))
+async def load_model():
+    global pipeline, baselines, meta, base_cols, base_matrix, live_kernel, feature_store
+    global allocator, explainer
+    global pool, batcher, shm
+    pipeline = joblib.load(MODEL_PATH)
     baselines = pd.read_csv(os.path.join(DEPLOY_DIR, "tile_baseline.csv"))
     with open(os.path.join(DEPLOY_DIR, "metadata.json")) as f:
         meta = json.load(f)
+    base_cols = [c for c in baselines.columns if c in meta["feature_cols"]]
+    base_matrix = baselines[base_cols].to_numpy(dtype=np.float64)
     print(f"✓ Model loaded — {len(baselines)} tiles, ROC-AUC {meta['roc_auc']}")
+    live_kernel = LiveFeatureKernel.from_deploy_dir(DEPLOY_DIR, baselines, base_cols, meta)
+    feature_store = FeatureStore.from_deploy_dir(DEPLOY_DIR, baselines, base_cols)
+    allocator = PatrolAllocator(baselines["h3_address"].tolist(),
+                                load_tile_district(DEPLOY_DIR, baselines))
+    allocator.disk(1)  # default patrol radius, built before the first /allocate
+    explainer = ContributionExplainer(pipeline, method=EXPLAIN_METHOD)
+
+    if PREDICT_MODE == "pool":
+        shm, shm_desc = create_shared_matrix(base_matrix)
+        pool = ProcessPoolExecutor(
+            max_workers=POOL_SIZE,
+            mp_context=mp.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(MODEL_PATH, shm_desc, base_cols, meta["feature_cols"]),
+        )
+        # Start every worker (and load its model copy) before taking traffic
+        for f in [pool.submit(worker_ready) for _ in range(POOL_SIZE)]:
+            f.result()
+        batcher = PredictBatcher(
+            pool, score_in_worker,
+            window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH, pool_size=POOL_SIZE,
+        )
+        batcher.start()
+        print(f"✓ Scoring pool — {POOL_SIZE} workers, "
+              f"{BATCH_WINDOW_MS:g} ms batch window, max batch {MAX_BATCH}")
+
+
+@app.on_event("shutdown")
+async def release_pool():
+    if batcher is not None:
+        await batcher.stop()
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+    if shm is not None:
+        shm.close()
+        shm.unlink()
 
 
 # ── Request / Response schemas ───────────────────────────────────────────────
@@ -39,7 +129,15 @@ class PredictRequest(BaseModel):
     query_date: str          # "2026-03-17"
     shift: str               # "morning_noon" | "afternoon_night" | "overnight"
     threshold: float = 0.055
-    live_lag: dict | None = None  # optional {h3_address: lag_1d_count, ...}
+    live_lag: dict | None = None  # optional {h3_address: {shift: count} | day count, ...}
+    explain: bool = False         # top contributing features per flagged tile
+    explain_top_k: int = 3
+
+
+class FeatureContribution(BaseModel):
+    feature: str
+    value: float
+    contribution: float           # in probability units
 
 
 class TileResult(BaseModel):
@@ -49,12 +147,48 @@ class TileResult(BaseModel):
     risk_tier: str
     shift: str
     query_date: str
+    explanation: list[FeatureContribution] | None = None
 
 
 class PredictResponse(BaseModel):
     results: list[TileResult]
     tile_count: int
     flagged_count: int
+    base_value: float | None = None  # probability before any feature contributes
+    feature_source: str = "baseline"  # "live" | "history" | "latest" | "baseline"
+
+
+class AllocateRequest(BaseModel):
+    query_date: str
+    shift: str
+    threshold: float = 0.055
+    live_lag: dict | None = None
+    units: dict[str, int]               # {district: number of units}
+    tile_district: dict[str, str] | None = None  # {h3_address: district}; None = deployed mapping
+    radius: int = 1                     # travel radius in H3 grid steps
+    solver: str = "greedy"              # "greedy" | "exact"
+    time_limit_ms: int = 800            # exact solver budget
+
+
+class UnitAssignment(BaseModel):
+    unit_id: str
+    district: str
+    center_h3: str
+    covered_tiles: list[str]
+    covered_risk: float
+
+
+class AllocateResponse(BaseModel):
+    assignments: list[UnitAssignment]
+    covered_risk: float
+    total_risk: float
+    coverage: float
+    flagged_count: int
+    covered_count: int
+    idle_units: dict[str, int]
+    solver: str
+    optimal: bool | None = None
+    solve_ms: float
 
 
 class MetadataResponse(BaseModel):
@@ -65,14 +199,7 @@ class MetadataResponse(BaseModel):
     tile_count: int
     trained_at: str
     feature_cols: list[str]
-
-
-# ── Shift encoding ───────────────────────────────────────────────────────────
-SHIFT_MAP = {
-    "morning_noon":     {"is_afternoon_night": 0, "is_overnight": 0},
-    "afternoon_night":  {"is_afternoon_night": 1, "is_overnight": 0},
-    "overnight":        {"is_afternoon_night": 0, "is_overnight": 1},
-}
+    feature_store: dict | None = None   # {"start_date", "end_date", "latest_date"}
 
 
 # ── Endpoints ────────────────────────────────────────────────────────────────
@@ -91,6 +218,9 @@ def get_metadata():
         tile_count=len(baselines),
         trained_at=meta.get("trained_at", "N/A"),
         feature_cols=meta["feature_cols"],
+        feature_store=None if feature_store is None else {
+            k: feature_store.index[k] for k in ("start_date", "end_date", "latest_date")
+        },
     )
 
 
@@ -125,6 +255,14 @@ def pr_at_threshold(threshold: float):
     )
 
 
+@app.get("/metrics")
+def get_metrics():
+    """Scoring queue metrics (queue depth, batch sizes, latencies)."""
+    if batcher is None:
+        return {"mode": "inline"}
+    return batcher.metrics()
+
+
 @app.get("/baselines")
 def get_baselines():
     """Return tile_baseline data so Streamlit can build the beat map without the model."""
@@ -134,55 +272,112 @@ def get_baselines():
     }
 
 
-@app.post("/predict", response_model=PredictResponse)
-def predict(req: PredictRequest):
-    if req.shift not in SHIFT_MAP:
+def apply_live_lag(live_lag: dict, shift: str, query_date) -> np.ndarray:
+    """
+    Baseline features recomputed from fresh per-tile counts (live kernel).
+    Past query dates start from the feature store's state as of that date.
+    """
+    kernel = None
+    if feature_store is not None:
+        kernel = feature_store.live_kernel_as_of(query_date)
+    kernel = kernel or live_kernel
+    return kernel.apply(kernel.fresh_counts(live_lag), shift, query_date)
+
+
+def as_of_features(query_date, shift, live_lag):
+    """(base matrix or None for the shared baseline, feature source)."""
+    if live_lag:
+        return apply_live_lag(live_lag, shift, query_date), "live"
+    if feature_store is not None:
+        return feature_store.lookup(query_date, shift, fallback=base_matrix)
+    return None, "baseline"
+
+
+async def score_request(query_date, shift, live_lag):
+    """
+    (spec, tile probabilities, feature source) for one date × shift, in
+    tile_baseline.csv order.
+    """
+    if shift not in SHIFT_MAP:
         raise HTTPException(400, f"Invalid shift. Use: {list(SHIFT_MAP.keys())}")
+    try:
+        ts = pd.Timestamp(query_date)
+    except ValueError:
+        ts = pd.NaT
+    if pd.isna(ts):
+        raise HTTPException(400, f"Invalid query_date: {query_date!r}")
+
+    # Live lag overrides, else the as-of features of the query date
+    base, source = as_of_features(query_date, shift, live_lag)
+    spec = ScoreSpec(query_date, shift, base)
+
+    # Predict — coalesced into a worker batch, or inline on the threadpool
+    if batcher is not None:
+        return spec, await batcher.submit(spec), source
+    return spec, (await run_in_threadpool(
+        score_specs, pipeline, [spec], base_matrix, base_cols, meta["feature_cols"]
+    ))[0], source
+
+
+async def explain_flagged(spec, flagged_idx, top_k):
+    """(base value, top-k contributions per flagged tile) for one scenario."""
+    entry = await run_in_threadpool(
+        explainer.explain,
+        explainer.scenario_key(spec.query_date, spec.shift, spec.base),
+        lambda: stack_features([spec], base_matrix, base_cols, meta["feature_cols"]),
+    )
+    return entry["base_value"], explainer.top_features(entry, flagged_idx, k=top_k)
 
-    tiles = baselines.copy()
-    feature_cols = meta["feature_cols"]
 
-    # Apply live lag overrides if provided
-    if req.live_lag:
-        lag_df = pd.DataFrame(
-            list(req.live_lag.items()), columns=["h3_address", "lag_1d_fresh"]
-        )
-        lag_df["lag_1d_fresh"] = pd.to_numeric(lag_df["lag_1d_fresh"], errors="coerce")
-        tiles = tiles.merge(lag_df, on="h3_address", how="left")
-        tiles["lag_1d"] = tiles["lag_1d_fresh"].fillna(tiles["lag_1d"])
-        tiles.drop(columns=["lag_1d_fresh"], inplace=True)
-
-    # Shift features
-    s = SHIFT_MAP[req.shift]
-    tiles["is_afternoon_night"] = s["is_afternoon_night"]
-    tiles["is_overnight"] = s["is_overnight"]
-
-    # Temporal features
-    dt = pd.Timestamp(req.query_date)
-    dow, mon = dt.dayofweek, dt.month
-    tiles["day_sin"] = np.sin(2 * np.pi * dow / 7)
-    tiles["day_cos"] = np.cos(2 * np.pi * dow / 7)
-    tiles["month_sin"] = np.sin(2 * np.pi * (mon - 1) / 12)
-    tiles["month_cos"] = np.cos(2 * np.pi * (mon - 1) / 12)
-
-    # Predict
-    X = tiles[feature_cols]
-    probs = pipeline.predict_proba(X)[:, 1]
-
-    results = tiles[["h3_address"]].copy()
+@app.post("/predict", response_model=PredictResponse, response_model_exclude_none=True)
+async def predict(req: PredictRequest):
+    spec, probs, source = await score_request(req.query_date, req.shift, req.live_lag)
+
+    results = baselines[["h3_address"]].copy()
     results["crime_probability"] = probs.round(4)
     results["flagged"] = (probs >= req.threshold).astype(int)
-    results["risk_tier"] = pd.cut(
-        probs, bins=[0, 0.10, 0.20, 0.35, 1.0],
-        labels=["Low", "Moderate", "High", "Critical"],
-    ).astype(str)
+    results["risk_tier"] = risk_tiers(probs)
     results["shift"] = req.shift
     results["query_date"] = req.query_date
 
+    base_value = None
+    if req.explain:
+        flagged_idx = np.flatnonzero(probs >= req.threshold)
+        base_value, top = await explain_flagged(spec, flagged_idx, max(req.explain_top_k, 1))
+        explanation = [None] * len(results)
+        for i, feats in zip(flagged_idx, top):
+            explanation[i] = feats
+        results["explanation"] = explanation
+
     results = results.sort_values("crime_probability", ascending=False).reset_index(drop=True)
 
     return PredictResponse(
         results=[TileResult(**row) for row in results.to_dict("records")],
         tile_count=len(results),
         flagged_count=int(results["flagged"].sum()),
+        base_value=base_value,
+        feature_source=source,
+    )
+
+
+@app.post("/allocate", response_model=AllocateResponse)
+async def allocate(req: AllocateRequest):
+    """Assign patrol units to clusters of flagged tiles (max expected covered risk)."""
+    if not 0 <= req.radius <= MAX_RADIUS:
+        raise HTTPException(400, f"radius must be between 0 and {MAX_RADIUS}")
+    if req.solver not in ("greedy", "exact"):
+        raise HTTPException(400, "Invalid solver. Use: ['greedy', 'exact']")
+    if any(n < 0 for n in req.units.values()):
+        raise HTTPException(400, "Unit counts must be non-negative")
+    if req.tile_district is None and allocator.tile_district is None and district_units(req.units):
+        raise HTTPException(
+            400, f"No tile → district mapping deployed ({TILE_DISTRICT_FILE}); "
+                 f"pass tile_district or use units={{'{CITY_WIDE}': n}}")
+
+    _, probs, _ = await score_request(req.query_date, req.shift, req.live_lag)
+    plan = await run_in_threadpool(
+        allocator.allocate, probs, req.threshold, req.units,
+        tile_district=req.tile_district, radius=req.radius,
+        solver=req.solver, time_limit_ms=req.time_limit_ms,
     )
+    return AllocateResponse(**plan)
@@ -0,0 +1,116 @@
+# =============================================================================
+# SCORING — feature assembly and batched scoring
+#
+# Used both inline by main.py and inside the scoring worker processes.
+# A request is described by a ScoreSpec (date, shift, optional per-tile base
+# matrix); any number of specs are stacked into ONE feature matrix and scored
+# with a single predict_proba call.
+#
+# Worker processes hold one model copy each and read the tile baseline
+# matrix from a shared-memory block created by the API process, so the
+# baseline is never pickled per request.
+# =============================================================================
+
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# ── Shift encoding ───────────────────────────────────────────────────────────
+SHIFT_MAP = {
+    "morning_noon":     {"is_afternoon_night": 0, "is_overnight": 0},
+    "afternoon_night":  {"is_afternoon_night": 1, "is_overnight": 0},
+    "overnight":        {"is_afternoon_night": 0, "is_overnight": 1},
+}
+
+# ── Risk tiers (API, inference notebook and backtest share these) ────────────
+TIER_BINS = [0, 0.10, 0.20, 0.35, 1.0]
+TIER_LABELS = ["Low", "Moderate", "High", "Critical"]
+
+
+def risk_tiers(probs) -> np.ndarray:
+    """Tier label per probability; a probability of exactly 0 is Low."""
+    return pd.cut(probs, bins=TIER_BINS, labels=TIER_LABELS, include_lowest=True).astype(str)
+
+
+@dataclass
+class ScoreSpec:
+    query_date: str
+    shift: str
+    base: np.ndarray | None = None   # (n_tiles, n_base_cols); None → shared baseline
+
+
+def request_features(query_date, shift) -> dict:
+    """Shift dummies + cyclical date features — constant across all tiles."""
+    dt = pd.Timestamp(query_date)
+    dow, mon = dt.dayofweek, dt.month
+    feats = dict(SHIFT_MAP[shift])
+    feats["day_sin"] = np.sin(2 * np.pi * dow / 7)
+    feats["day_cos"] = np.cos(2 * np.pi * dow / 7)
+    feats["month_sin"] = np.sin(2 * np.pi * (mon - 1) / 12)
+    feats["month_cos"] = np.cos(2 * np.pi * (mon - 1) / 12)
+    return feats
+
+
+def stack_features(specs, baseline, base_cols, feature_cols) -> pd.DataFrame:
+    """Stack the feature rows of every spec into one frame (spec order kept)."""
+    n_tiles = baseline.shape[0]
+    base_idx = {c: i for i, c in enumerate(base_cols)}
+    X = np.empty((n_tiles * len(specs), len(feature_cols)), dtype=np.float64)
+
+    for k, spec in enumerate(specs):
+        block = X[k * n_tiles:(k + 1) * n_tiles]
+        base = baseline if spec.base is None else spec.base
+        const = request_features(spec.query_date, spec.shift)
+        for j, col in enumerate(feature_cols):
+            if col in base_idx:
+                block[:, j] = base[:, base_idx[col]]
+            else:
+                block[:, j] = const[col]
+
+    return pd.DataFrame(X, columns=feature_cols)
+
+
+def score_specs(pipeline, specs, baseline, base_cols, feature_cols) -> list:
+    """Score a batch of specs in one predict_proba call; one array per spec."""
+    X = stack_features(specs, baseline, base_cols, feature_cols)
+    probs = pipeline.predict_proba(X)[:, 1]
+    return np.split(probs, len(specs))
+
+
+# ── Shared baseline matrix ───────────────────────────────────────────────────
+def create_shared_matrix(matrix: np.ndarray):
+    """Copy `matrix` into a new shared-memory block; returns (shm, descriptor)."""
+    matrix = np.ascontiguousarray(matrix)
+    shm = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+    np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)[:] = matrix
+    return shm, (shm.name, matrix.shape, matrix.dtype.str)
+
+
+# ── Worker process side ──────────────────────────────────────────────────────
+_worker = {}
+
+
+def init_worker(model_path, shm_desc, base_cols, feature_cols):
+    """ProcessPoolExecutor initializer: load one model copy, attach baseline."""
+    name, shape, dtype = shm_desc
+    shm = shared_memory.SharedMemory(name=name)
+    _worker["shm"] = shm  # keep the mapping alive for the worker's lifetime
+    _worker["baseline"] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    _worker["pipeline"] = joblib.load(model_path)
+    _worker["base_cols"] = list(base_cols)
+    _worker["feature_cols"] = list(feature_cols)
+
+
+def worker_ready() -> bool:
+    """No-op task used to force worker start-up (model load) at API start."""
+    return "pipeline" in _worker
+
+
+def score_in_worker(specs) -> list:
+    return score_specs(
+        _worker["pipeline"], specs, _worker["baseline"],
+        _worker["base_cols"], _worker["feature_cols"],
+    )
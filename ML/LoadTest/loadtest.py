@@ -0,0 +1,360 @@
+# =============================================================================
+# API LOAD TEST — concurrency ramp against main.py with a local SODA stand-in
+#
+# Starts the FastAPI backend (ML/Deploy_Render/main.py) as a subprocess — or
+# in-process, or uses an already running URL — next to the SODA stand-in
+# (soda_stub.py), then drives a dashboard-like request mix from an async
+# client at increasing concurrency:
+#   predict_static   POST /predict for a random date / shift / threshold
+#   predict_live     page the stand-in's crimes for the previous day
+#                    ($where / $order / $limit / $offset), aggregate them to
+#                    per-shift H3 counts and POST /predict with live_lag
+#   metadata         GET /metadata
+#   baselines        GET /baselines
+#   pr_at_threshold  GET /pr_at_threshold
+#
+# Every stage reports throughput, latency percentiles and the error rate.
+# The instance's capacity is the last stage before the first one that
+# misses the SLOs (--slo-p95-ms, --slo-error-rate); a stage that passes
+# again after a failure does not count. --min-concurrency turns the
+# run into a deployment gate (exit code 1 below it). Nothing leaves the
+# machine.
+#
+# Usage (from ML/LoadTest/):
+#   python loadtest.py                                 # 1 → 32 users, 15 s each
+#   python loadtest.py --stages 1,4,16 --stage-seconds 30 --soda-latency-ms 200
+#   PREDICT_MODE=pool python loadtest.py --min-concurrency 8 --report report.json
+# =============================================================================
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.normpath(os.path.join(HERE, "..", "Deploy_Render"))
+
+CRIMES_RESOURCE = "/resource/f6bk-yv3r.json"
+VIOLENT_TYPES = ["BATTERY", "ASSAULT", "ROBBERY"]
+SHIFTS = ["morning_noon", "afternoon_night", "overnight"]
+H3_RES = 8
+SODA_PAGE = 1000
+
+DEFAULT_MIX = {
+    "predict_static": 45,
+    "predict_live": 15,
+    "metadata": 15,
+    "baselines": 10,
+    "pr_at_threshold": 15,
+}
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 1. SERVERS
+# ═════════════════════════════════════════════════════════════════════════════
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_in_thread(app, port):
+    """Run an ASGI app with uvicorn on a daemon thread; returns the server."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def start_api_subprocess(port, env=None) -> subprocess.Popen:
+    """uvicorn main:app in ML/Deploy_Render, inheriting PREDICT_MODE etc."""
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR, env={**os.environ, **(env or {})},
+    )
+
+
+def wait_healthy(base_url, timeout=180):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            r = httpx.get(f"{base_url}/health", timeout=2)
+            if r.status_code == 200 and r.json().get("tiles"):
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"API at {base_url} did not become healthy in {timeout}s")
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2. REQUEST MIX
+# ═════════════════════════════════════════════════════════════════════════════
+def random_query(rng):
+    query_date = date.today() + timedelta(days=rng.randint(-30, 7))
+    return {
+        "query_date": str(query_date),
+        "shift": rng.choice(SHIFTS),
+        "threshold": round(rng.uniform(0.05, 0.20), 2),
+    }
+
+
+async def fetch_live_lag(client, soda_url, query_date) -> dict:
+    """The dashboard's live-lag query, paged: previous day's violent crimes per tile and shift."""
+    import h3
+
+    target = date.fromisoformat(query_date)
+    yesterday = target - timedelta(days=1)
+    where = (
+        f"date >= '{target - timedelta(days=2)}' AND date < '{target + timedelta(days=1)}' "
+        f"AND primary_type in({','.join(repr(t) for t in VIOLENT_TYPES)})"
+    )
+    counts = defaultdict(lambda: dict.fromkeys(SHIFTS, 0.0))
+    offset = 0
+    while True:
+        r = await client.get(f"{soda_url}{CRIMES_RESOURCE}", params={
+            "$where": where, "$order": "date ASC", "$limit": SODA_PAGE, "$offset": offset,
+        })
+        r.raise_for_status()
+        rows = r.json()
+        for row in rows:
+            ts = datetime.fromisoformat(row["date"])
+            # Shifts 06–13 / 14–21 / 22–05; pre-06:00 crimes belong to the previous day
+            shift = SHIFTS[0] if 6 <= ts.hour <= 13 else SHIFTS[1] if 14 <= ts.hour <= 21 else SHIFTS[2]
+            shift_date = ts.date() - timedelta(days=1) if ts.hour < 6 else ts.date()
+            if shift_date == yesterday:
+                cell = h3.latlng_to_cell(float(row["latitude"]), float(row["longitude"]), H3_RES)
+                counts[cell][shift] += 1
+        if len(rows) < SODA_PAGE:
+            return dict(counts)
+        offset += SODA_PAGE
+
+
+async def run_op(op, client, api_url, soda_url, rng):
+    """Issue one operation; raises on any non-2xx response."""
+    if op == "predict_static":
+        r = await client.post(f"{api_url}/predict", json=random_query(rng))
+    elif op == "predict_live":
+        payload = random_query(rng)
+        payload["live_lag"] = await fetch_live_lag(client, soda_url, payload["query_date"])
+        r = await client.post(f"{api_url}/predict", json=payload)
+    elif op == "metadata":
+        r = await client.get(f"{api_url}/metadata")
+    elif op == "baselines":
+        r = await client.get(f"{api_url}/baselines")
+    elif op == "pr_at_threshold":
+        r = await client.get(f"{api_url}/pr_at_threshold",
+                             params={"threshold": round(rng.uniform(0.05, 0.5), 3)})
+    else:
+        raise ValueError(f"Unknown operation: {op!r}")
+    r.raise_for_status()
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3. LOAD STAGES
+# ═════════════════════════════════════════════════════════════════════════════
+async def run_stage(api_url, soda_url, concurrency, seconds, mix, timeout, think_ms, seed) -> list:
+    """Closed-loop virtual users for `seconds`; one record per completed operation."""
+    import httpx
+
+    ops, weights = zip(*mix.items())
+    records = []
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def user(uid):
+            rng = random.Random(seed * 10_007 + uid)
+            while time.perf_counter() < deadline:
+                op = rng.choices(ops, weights)[0]
+                t0 = time.perf_counter()
+                error = None
+                try:
+                    await run_op(op, client, api_url, soda_url, rng)
+                except httpx.HTTPStatusError as e:
+                    error = f"HTTP {e.response.status_code}"
+                except (httpx.HTTPError, ValueError, KeyError) as e:
+                    error = type(e).__name__
+                records.append({"op": op, "ms": (time.perf_counter() - t0) * 1000,
+                                "error": error})
+                if think_ms:
+                    await asyncio.sleep(rng.expovariate(1000.0 / think_ms))
+
+        t_start = time.perf_counter()
+        await asyncio.gather(*(user(u) for u in range(concurrency)))
+        elapsed = time.perf_counter() - t_start
+    for r in records:
+        r["stage_s"] = elapsed
+    return records
+
+
+def summarize(records, concurrency) -> dict:
+    ms = np.array([r["ms"] for r in records]) if records else np.array([np.nan])
+    errors = Counter(r["error"] for r in records if r["error"])
+    elapsed = records[0]["stage_s"] if records else float("nan")
+    n = len(records)
+    by_op = defaultdict(list)
+    for r in records:
+        by_op[r["op"]].append(r["ms"])
+    return {
+        "concurrency": concurrency,
+        "requests": n,
+        "throughput_rps": n / elapsed if n else 0.0,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "error_rate": sum(errors.values()) / n if n else 1.0,
+        "errors": dict(errors),
+        "ops": {op: {"requests": len(v),
+                     "p50_ms": float(np.percentile(v, 50)),
+                     "p95_ms": float(np.percentile(v, 95))}
+                for op, v in sorted(by_op.items())},
+    }
+
+
+def meets_slo(s, slo_p95_ms, slo_error_rate) -> bool:
+    return s["p95_ms"] <= slo_p95_ms and s["error_rate"] <= slo_error_rate
+
+
+def capacity_of(stages, slo_p95_ms, slo_error_rate) -> int:
+    """Concurrency of the last stage before the first SLO failure (0 if none)."""
+    capacity = 0
+    for s in stages:
+        if not meets_slo(s, slo_p95_ms, slo_error_rate):
+            break
+        capacity = s["concurrency"]
+    return capacity
+
+
+def print_stage(s, slo_p95_ms, slo_error_rate):
+    ok = meets_slo(s, slo_p95_ms, slo_error_rate)
+    print(f"{'✓' if ok else '⚠'} {s['concurrency']:>5} {s['requests']:>9,} "
+          f"{s['throughput_rps']:>8.1f} {s['p50_ms']:>8.0f} {s['p95_ms']:>8.0f} "
+          f"{s['p99_ms']:>8.0f} {s['error_rate']:>7.2%}"
+          + (f"   {s['errors']}" if s["errors"] else ""))
+
+
+def parse_mix(text) -> dict:
+    mix = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown operation in mix: {op!r}")
+        mix[op.strip()] = float(weight)
+    return mix
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 4. DRIVER
+# ═════════════════════════════════════════════════════════════════════════════
+def run_load_test(args) -> dict:
+    from soda_stub import create_app
+
+    soda_port = free_port()
+    serve_in_thread(create_app(args.soda_latency_ms, args.soda_jitter_ms), soda_port)
+    soda_url = f"http://127.0.0.1:{soda_port}"
+    print(f"✓ SODA stand-in at {soda_url} "
+          f"({args.soda_latency_ms:g} ± {args.soda_jitter_ms:g} ms latency)")
+
+    proc = None
+    if args.api_url:
+        api_url = args.api_url.rstrip("/")
+    else:
+        port = free_port()
+        api_url = f"http://127.0.0.1:{port}"
+        if args.api == "subprocess":
+            proc = start_api_subprocess(port)
+        else:
+            sys.path.insert(0, API_DIR)
+            import main
+            serve_in_thread(main.app, port)
+    try:
+        wait_healthy(api_url)
+        print(f"✓ API at {api_url} ({args.api if not args.api_url else 'external'}, "
+              f"PREDICT_MODE={os.environ.get('PREDICT_MODE', 'inline')})")
+
+        # Warm-up: first requests load caches / thread pools
+        asyncio.run(run_stage(api_url, soda_url, 1, args.warmup_seconds, args.mix,
+                              args.timeout, 0, seed=0))
+
+        print(f"\n  {'users':>5} {'requests':>9} {'req/s':>8} {'p50 ms':>8} "
+              f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        stages = []
+        for i, c in enumerate(args.stages):
+            records = asyncio.run(run_stage(api_url, soda_url, c, args.stage_seconds, args.mix,
+                                            args.timeout, args.think_ms, seed=i + 1))
+            stages.append(summarize(records, c))
+            print_stage(stages[-1], args.slo_p95_ms, args.slo_error_rate)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    capacity = capacity_of(stages, args.slo_p95_ms, args.slo_error_rate)
+    return {
+        "api_url": api_url,
+        "predict_mode": os.environ.get("PREDICT_MODE", "inline"),
+        "mix": args.mix,
+        "slo": {"p95_ms": args.slo_p95_ms, "error_rate": args.slo_error_rate},
+        "capacity_concurrency": capacity,
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the crime prediction API offline.")
+    parser.add_argument("--api", choices=["subprocess", "inprocess"], default="subprocess",
+                        help="how to start main.py (in-process shares the GIL with the client)")
+    parser.add_argument("--api-url", default=None, help="test an already running API instead")
+    parser.add_argument("--stages", type=lambda s: [int(x) for x in s.split(",")],
+                        default=[1, 2, 4, 8, 16, 32], help="concurrent users per stage")
+    parser.add_argument("--stage-seconds", type=float, default=15.0)
+    parser.add_argument("--warmup-seconds", type=float, default=3.0)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="op=weight list, e.g. predict_static=60,metadata=40")
+    parser.add_argument("--think-ms", type=float, default=0.0,
+                        help="mean think time between a user's requests (0 = closed loop)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout (s)")
+    parser.add_argument("--soda-latency-ms", type=float, default=100.0)
+    parser.add_argument("--soda-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--slo-p95-ms", type=float, default=2000.0)
+    parser.add_argument("--slo-error-rate", type=float, default=0.01)
+    parser.add_argument("--min-concurrency", type=int, default=0,
+                        help="exit 1 if the SLOs fail below this many users")
+    parser.add_argument("--report", default=None, help="write the full report as JSON")
+    args = parser.parse_args()
+
+    report = run_load_test(args)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=1)
+
+    capacity = report["capacity_concurrency"]
+    print(f"\nCapacity: {capacity} concurrent users within p95 ≤ {args.slo_p95_ms:g} ms "
+          f"and errors ≤ {args.slo_error_rate:.1%}")
+    if capacity < args.min_concurrency:
+        print(f"⚠ Gate failed: below the required {args.min_concurrency} users")
+        sys.exit(1)
+    if args.min_concurrency:
+        print(f"✓ Gate passed (≥ {args.min_concurrency} users)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# =============================================================================
+# SODA STAND-IN — offline replacement for the data.cityofchicago.org endpoints
+#
+# Serves the three Socrata resources the dashboard reads, generated from the
+# deployed tile grid (ML/Deploy_Render/deployment/tile_baseline.csv):
+#   /resource/f6bk-yv3r.json   crimes: Poisson counts per tile and day at the
+#                              tile's 30-day rate, deterministic per date
+#   /resource/n9it-hstw.json   police beats: H3 res-6 parents of the tiles,
+#                              districts = res-5 parents
+#   /resource/igwz-8jzy.json   community areas: H3 res-5 parents
+#
+# Supported SoQL subset (what the dashboard and the load test send):
+#   $where   comparisons (=, !=, <, <=, >, >=) on a field against a quoted
+#            string or number, `field in('A','B')`, joined with AND
+#   $order   "field [ASC|DESC]"
+#   $limit / $offset   paging (Socrata default limit 1000)
+# Every response waits `latency_ms` ± `jitter_ms` first, like a remote API.
+#
+# Run standalone:
+#   python soda_stub.py --port 8001 --latency-ms 150
+# then point the dashboard at it with SODA_BASE_URL=http://127.0.0.1:8001
+# =============================================================================
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEPLOY_DIR = os.path.join(HERE, "..", "Deploy_Render", "deployment")
+
+PRIMARY_TYPES = ["BATTERY", "ASSAULT", "ROBBERY", "THEFT", "CRIMINAL DAMAGE"]
+TYPE_WEIGHTS = [0.30, 0.15, 0.05, 0.35, 0.15]   # violent share ≈ 50 %
+DEFAULT_LIMIT = 1000
+
+
+# ── Synthetic datasets ───────────────────────────────────────────────────────
+class SodaData:
+    """Deterministic synthetic crimes, beats and community areas for the tile grid."""
+
+    def __init__(self, deploy_dir=DEPLOY_DIR):
+        import h3
+
+        baselines = pd.read_csv(os.path.join(deploy_dir, "tile_baseline.csv"))
+        with open(os.path.join(deploy_dir, "metadata.json")) as f:
+            meta = json.load(f)
+        city_baseline = meta.get("city_baseline", meta.get("base_rate", 0.07))
+
+        self.tiles = baselines["h3_address"].tolist()
+        centres = np.array([h3.cell_to_latlng(h) for h in self.tiles])
+        self.lat, self.lon = centres[:, 0], centres[:, 1]
+        # Daily incidents per tile: 3 shifts at the tile's 30-day level; the
+        # violent types make up half of all generated incidents
+        self.rate = 2 * 3 * city_baseline * baselines["rolling_30d_mean_norm"].to_numpy()
+        self.beats = self._areas(sorted({h3.cell_to_parent(h, 6) for h in self.tiles}), "beat")
+        self.communities = self._areas(
+            sorted({h3.cell_to_parent(h, 5) for h in self.tiles}), "community")
+
+    @staticmethod
+    def _areas(cells, kind) -> list:
+        import h3
+
+        rows = []
+        for i, cell in enumerate(cells):
+            ring = [[lon, lat] for lat, lon in h3.cell_to_boundary(cell)]
+            geom = {"type": "MultiPolygon", "coordinates": [[ring + ring[:1]]]}
+            if kind == "beat":
+                district = str(int(h3.cell_to_parent(cell, 5), 16) % 25 + 1)
+                rows.append({"beat_num": f"{int(district):02d}{i % 100:02d}",
+                             "district": district, "the_geom": geom})
+            else:
+                rows.append({"area_numbe": str(i + 1), "community": f"AREA {i + 1}",
+                             "the_geom": geom})
+        return rows
+
+    @lru_cache(maxsize=64)
+    def crimes_on(self, day: date) -> tuple:
+        """Incidents of one day (cached; same output for the same date)."""
+        rng = np.random.default_rng(day.toordinal())
+        counts = rng.poisson(self.rate)
+        idx = np.repeat(np.arange(len(self.tiles)), counts)
+        n = len(idx)
+        seconds = np.sort(rng.integers(0, 86400, n))
+        types = rng.choice(len(PRIMARY_TYPES), size=n, p=TYPE_WEIGHTS)
+        jitter = rng.uniform(-0.002, 0.002, size=(n, 2))
+        start = datetime(day.year, day.month, day.day)
+        rows = []
+        for k in range(n):
+            i = idx[k]
+            rows.append({
+                "id": str(day.toordinal() * 100_000 + k),
+                "case_number": f"JZ{day.strftime('%y%m%d')}{k:05d}",
+                "date": (start + timedelta(seconds=int(seconds[k]))).strftime("%Y-%m-%dT%H:%M:%S.000"),
+                "primary_type": PRIMARY_TYPES[types[k]],
+                "latitude": f"{self.lat[i] + jitter[k, 0]:.9f}",
+                "longitude": f"{self.lon[i] + jitter[k, 1]:.9f}",
+            })
+        return tuple(rows)
+
+    def crimes_between(self, start: date, end: date) -> list:
+        rows = []
+        day = start
+        while day < end:
+            rows.extend(self.crimes_on(day))
+            day += timedelta(days=1)
+        return rows
+
+
+# ── SoQL subset ──────────────────────────────────────────────────────────────
+_CMP = re.compile(r"^\s*(\w+)\s*(>=|<=|!=|=|<|>)\s*('([^']*)'|[-\d.]+)\s*$")
+_IN = re.compile(r"^\s*(\w+)\s+in\s*\((.*)\)\s*$", re.IGNORECASE)
+_OPS = {
+    "=": lambda a, b: a == b, "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+}
+
+
+def parse_where(where: str) -> list:
+    """SoQL $where (AND of simple clauses) → list of row predicates."""
+    preds = []
+    for clause in re.split(r"\s+AND\s+", where.strip(), flags=re.IGNORECASE):
+        m = _IN.match(clause)
+        if m:
+            field = m.group(1)
+            values = {v.strip().strip("'") for v in m.group(2).split(",")}
+            preds.append(lambda r, f=field, vs=values: r.get(f) in vs)
+            continue
+        m = _CMP.match(clause)
+        if not m:
+            raise ValueError(f"Unsupported $where clause: {clause!r}")
+        field, op, literal, quoted = m.groups()
+        if quoted is None:
+            value = float(literal)
+            preds.append(lambda r, f=field, o=_OPS[op], v=value:
+                         r.get(f) is not None and o(float(r[f]), v))
+        else:
+            preds.append(lambda r, f=field, o=_OPS[op], v=quoted:
+                         r.get(f) is not None and o(str(r[f]), v))
+    return preds
+
+
+def _date_bounds(where: str):
+    """Day range [lo, hi) implied by the `date` comparisons (for generation)."""
+    lo = hi = None
+    for op, value in re.findall(r"date\s*(>=|>|<=|<)\s*'([^']+)'", where, flags=re.IGNORECASE):
+        ts = pd.Timestamp(value)
+        if op in (">=", ">"):
+            d = ts.date()
+            lo = d if lo is None else max(lo, d)
+        else:
+            # an exclusive bound at midnight ends the day before
+            d = ts.date() if op == "<" and ts == ts.normalize() else ts.date() + timedelta(days=1)
+            hi = d if hi is None else min(hi, d)
+    return lo, hi
+
+
+def apply_query(rows, params) -> list:
+    where = params.get("$where")
+    if where:
+        preds = parse_where(where)
+        rows = [r for r in rows if all(p(r) for p in preds)]
+    order = params.get("$order")
+    if order:
+        field, _, direction = order.partition(" ")
+        rows = sorted(rows, key=lambda r: r.get(field) or "",
+                      reverse=direction.strip().upper() == "DESC")
+    offset = int(params.get("$offset", 0))
+    limit = int(params.get("$limit", DEFAULT_LIMIT))
+    return rows[offset:offset + limit]
+
+
+# ── App ──────────────────────────────────────────────────────────────────────
+def create_app(latency_ms=0.0, jitter_ms=0.0, deploy_dir=DEPLOY_DIR, max_days=31) -> FastAPI:
+    app = FastAPI(title="SODA stand-in")
+    data = SodaData(deploy_dir)
+    app.state.requests = 0
+
+    async def delay():
+        app.state.requests += 1
+        wait = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+        if wait > 0:
+            await asyncio.sleep(wait / 1000.0)
+
+    @app.get("/resource/f6bk-yv3r.json")
+    async def crimes(request: Request):
+        await delay()
+        params = dict(request.query_params)
+        lo, hi = _date_bounds(params.get("$where", ""))
+        if lo is None or hi is None or (hi - lo).days > max_days:
+            raise HTTPException(400, f"Bound the query by date (at most {max_days} days)")
+        try:
+            return apply_query(data.crimes_between(lo, hi), params)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+    @app.get("/resource/n9it-hstw.json")
+    async def beats(request: Request):
+        await delay()
+        return apply_query(data.beats, dict(request.query_params))
+
+    @app.get("/resource/igwz-8jzy.json")
+    async def communities(request: Request):
+        await delay()
+        return apply_query(data.communities, dict(request.query_params))
+
+    @app.get("/stats")
+    def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the offline SODA stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms, args.jitter_ms), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
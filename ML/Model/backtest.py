@@ -0,0 +1,236 @@
+# =============================================================================
+# FIXED-MODEL BACKTEST — replay the dispatch board day by day
+#
+# Scores every (date, shift) tile row of an engineered feature table with a
+# packaged model in ONE batched predict_proba call, then reports what the
+# dispatch board would have flagged on each day:
+#   - precision / recall / flagged workload / hit rate
+#   - for every threshold in a sweep, per day × shift, district and risk tier
+#
+# The threshold sweep never rescores: each probability is bucketed once
+# against the sorted threshold grid, and cumulative bucket counts give the
+# confusion counts at every threshold simultaneously.
+#
+# This is NOT a rolling-origin backtest: the same fitted model scores every
+# day and is never refitted per origin. Days inside its training window are
+# in-sample, so start the period after the training cutoff.
+#
+# Usage (from the training notebook, after engineer_features):
+#   from backtest import fixed_model_backtest
+#   from scoring import risk_tiers          # ML/Deploy_Render on sys.path
+#   bt = fixed_model_backtest(final_df, "deployment/xgb_calibrated_pipeline.joblib",
+#                             start="2025-01-01", end="2025-12-31",
+#                             tile_district=tile_district_map, risk_tiers=risk_tiers)
+#   bt["overall"], bt["daily"], bt["district"], bt["tier"]
+# =============================================================================
+
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# ── Defaults (match training notebook / main.py) ─────────────────────────────
+CATEGORICAL_COLS = ["is_afternoon_night", "is_overnight"]
+NUMERIC_COLS = [
+    "lag_1d",
+    "rolling_7d_mean_norm",
+    "rolling_30d_mean_norm",
+    "tile_crime_density_percentile",
+    "tile_momentum",
+    "day_sin", "day_cos",
+    "month_sin", "month_cos",
+    "neighbor_lag_1d_norm",
+]
+FEATURE_COLS = CATEGORICAL_COLS + NUMERIC_COLS
+
+DEFAULT_THRESHOLDS = np.round(np.arange(0.02, 0.505, 0.005), 3)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 1. THRESHOLD SWEEP KERNEL
+# ═════════════════════════════════════════════════════════════════════════════
+def _above(counts):
+    """Per-threshold totals from bucket counts: column j sums buckets j+1..T."""
+    return np.cumsum(counts[:, ::-1], axis=1)[:, ::-1][:, 1:]
+
+
+def sweep_counts(group_codes, n_groups, probs, target, crimes, thresholds):
+    """
+    Confusion counts for every group at every threshold in one pass.
+
+    Each probability is bucketed against the ascending threshold grid
+    (bucket k = number of thresholds <= prob), so a row is flagged at
+    threshold j exactly when j < k. Bucket histograms per group are then
+    turned into "flagged at threshold j" counts by a reverse cumulative sum.
+
+    Returns a dict of (n_groups, n_thresholds) arrays — flagged, tp,
+    crimes_captured — and (n_groups,) arrays — n_tiles, positives, crimes.
+    """
+    n_t = len(thresholds)
+    bucket = np.searchsorted(thresholds, probs, side="right")
+    flat = group_codes.astype(np.int64) * (n_t + 1) + bucket
+    size = n_groups * (n_t + 1)
+
+    rows = np.bincount(flat, minlength=size).reshape(n_groups, n_t + 1)
+    hits = np.bincount(flat, weights=target, minlength=size).reshape(n_groups, n_t + 1)
+    caught = np.bincount(flat, weights=crimes, minlength=size).reshape(n_groups, n_t + 1)
+
+    return {
+        "flagged": _above(rows),
+        "tp": _above(hits),
+        "crimes_captured": _above(caught),
+        "n_tiles": rows.sum(axis=1),
+        "positives": hits.sum(axis=1),
+        "crimes": caught.sum(axis=1),
+    }
+
+
+def _safe_div(num, den):
+    num = np.asarray(num, dtype=float)
+    den = np.broadcast_to(np.asarray(den, dtype=float), num.shape)
+    out = np.full(num.shape, np.nan)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def _metrics_frame(keys: pd.DataFrame, counts: dict, thresholds) -> pd.DataFrame:
+    """Long DataFrame: one row per (group key, threshold)."""
+    n_groups, n_t = counts["flagged"].shape
+    per_group = lambda a: np.repeat(a, n_t)  # noqa: E731
+
+    out = keys.loc[keys.index.repeat(n_t)].reset_index(drop=True)
+    out["threshold"] = np.tile(thresholds, n_groups)
+    out["n_tiles"] = per_group(counts["n_tiles"])
+    out["flagged"] = counts["flagged"].ravel()
+    out["tp"] = counts["tp"].ravel()
+    out["positives"] = per_group(counts["positives"])
+    out["crimes"] = per_group(counts["crimes"])
+    out["crimes_captured"] = counts["crimes_captured"].ravel()
+
+    out["precision"] = _safe_div(counts["tp"], counts["flagged"]).ravel()
+    out["recall"] = _safe_div(counts["tp"], counts["positives"][:, None]).ravel()
+    out["workload"] = _safe_div(counts["flagged"], counts["n_tiles"][:, None]).ravel()
+    out["hit_rate"] = _safe_div(counts["crimes_captured"], counts["crimes"][:, None]).ravel()
+
+    int_cols = ["n_tiles", "flagged", "tp", "positives"]
+    out[int_cols] = out[int_cols].astype(int)
+    return out
+
+
+def _grouped_metrics(frame, group_cols, probs, target, crimes, thresholds):
+    grouped = frame.groupby(group_cols, sort=True, observed=True)
+    codes = grouped.ngroup().to_numpy()
+    keys = grouped.size().index.to_frame(index=False)
+    counts = sweep_counts(codes, len(keys), probs, target, crimes, thresholds)
+    return _metrics_frame(keys, counts, thresholds)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2. BACKTEST DRIVER
+# ═════════════════════════════════════════════════════════════════════════════
+def fixed_model_backtest(final_df: pd.DataFrame, model, start=None, end=None,
+                         thresholds=None, tile_district=None, risk_tiers=None,
+                         feature_cols=FEATURE_COLS) -> dict:
+    """
+    Replay the dispatch board over [start, end] from the engineered
+    tile-shift table (output of engineer_features), scoring every day with
+    the one fitted `model` (no per-origin refit).
+
+    model         : fitted pipeline, or path to a .joblib artefact
+    thresholds    : iterable of dispatch thresholds (default 0.020 → 0.500)
+    tile_district : optional {h3_address: district} mapping (e.g. from the
+                    Streamlit beat join); tiles without a match → "Unknown"
+    risk_tiers    : optional probs → tier labels function; pass the API's
+                    scoring.risk_tiers so tiers match /predict. None skips
+                    the tier breakdown
+
+    Returns a dict of DataFrames:
+      "scores"   — per-row probability (and risk tier)
+      "overall"  — per threshold, whole period
+      "daily"    — per shift_date × shift × threshold
+      "district" — per shift_date × district × threshold
+      "tier"     — per shift_date × risk_tier × threshold (None without risk_tiers)
+    """
+    if isinstance(model, str):
+        model = joblib.load(model)
+
+    df = final_df
+    df_dates = pd.to_datetime(df["shift_date"])
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None:
+        mask &= (df_dates >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (df_dates <= pd.Timestamp(end)).to_numpy()
+    df = df.loc[mask].dropna(subset=list(feature_cols) + ["target"])
+    if df.empty:
+        raise ValueError("No rows to backtest in the requested period.")
+
+    thresholds = np.unique(np.asarray(
+        DEFAULT_THRESHOLDS if thresholds is None else thresholds, dtype=float
+    ))
+
+    # ── One batched scoring pass over every (date, shift, tile) ───────────
+    t0 = time.perf_counter()
+    probs = model.predict_proba(df[list(feature_cols)])[:, 1]
+    t_score = time.perf_counter() - t0
+
+    target = df["target"].to_numpy(dtype=float)
+    crimes = (df["crime_count"] if "crime_count" in df else df["target"]).to_numpy(dtype=float)
+
+    frame = pd.DataFrame({
+        "h3_address": df["h3_address"].to_numpy(),
+        "shift_date": pd.to_datetime(df["shift_date"]).to_numpy(),
+        "shift": df["shift"].to_numpy(),
+    })
+    frame["district"] = (
+        frame["h3_address"].map(tile_district).fillna("Unknown").astype(str)
+        if tile_district is not None else "ALL"
+    )
+    if risk_tiers is not None:
+        frame["risk_tier"] = risk_tiers(probs)
+    frame["_all"] = "ALL"
+
+    # ── Threshold sweep per grouping ──────────────────────────────────────
+    t0 = time.perf_counter()
+    args = (probs, target, crimes, thresholds)
+    overall = _grouped_metrics(frame, ["_all"], *args).drop(columns=["_all"])
+    daily = _grouped_metrics(frame, ["shift_date", "shift"], *args)
+    district = _grouped_metrics(frame, ["shift_date", "district"], *args)
+    tier = (_grouped_metrics(frame, ["shift_date", "risk_tier"], *args)
+            if risk_tiers is not None else None)
+    t_sweep = time.perf_counter() - t0
+
+    scores = frame.drop(columns=["_all"])
+    scores["crime_probability"] = probs
+    scores["target"] = target.astype(int)
+
+    n_days = frame["shift_date"].nunique()
+    print(f"✓ Backtest: {len(frame):,} tile-shifts over {n_days:,} days "
+          f"× {len(thresholds)} thresholds")
+    print(f"  Scoring {t_score:.2f}s | threshold sweep {t_sweep:.2f}s")
+
+    return {
+        "scores": scores,
+        "overall": overall,
+        "daily": daily,
+        "district": district,
+        "tier": tier,
+    }
+
+
+def summarize_backtest(daily: pd.DataFrame) -> pd.DataFrame:
+    """
+    Distribution of day-level metrics per threshold (mean / p10 / p90),
+    i.e. how stable the dispatch board is from one shift to the next.
+    """
+    metrics = ["precision", "recall", "workload", "hit_rate"]
+    grouped = daily.groupby("threshold")[metrics]
+    summary = pd.concat({
+        "mean": grouped.mean(),
+        "p10": grouped.quantile(0.10),
+        "p90": grouped.quantile(0.90),
+    }, axis=1)
+    summary.columns = [f"{m}_{stat}" for stat, m in summary.columns]
+    summary["flagged_per_shift"] = daily.groupby("threshold")["flagged"].mean()
+    return summary.reset_index()
@@ -0,0 +1,269 @@
+# =============================================================================
+# SUCCESSIVE-HALVING TUNING — parallel search on cached fold matrices
+#
+# Replaces the per-model RandomizedSearchCV runs of Step 5.5:
+#   - the tuning sample is preprocessed ONCE into a float32 matrix on disk
+#     (X.npy, y.npy + folds.json); TimeSeriesSplit folds are contiguous
+#     row ranges of it, so every trial of every model family reads the
+#     same memory-mapped data and nothing is re-encoded per candidate
+#   - each family samples `n_candidates` settings from its grid and
+#     successively halves them: all candidates are scored on the most
+#     recent 1/eta^k of each fold's training window, the best 1/eta move
+#     on with eta× more rows, until the survivors train on full folds
+#   - every (candidate, fold) fit of every family runs as one task in a
+#     shared process pool, one model thread per task
+#   - per-trial fit time (summed over folds) and fold scores are logged
+#
+# Usage (from the training notebook, after the Step 5.5 setup cell):
+#   from tuning import build_fold_cache, successive_halving
+#   cache = build_fold_cache(X_tune, y_tune, preprocessor, N_SPLITS, "tuning_cache")
+#   tuned = successive_halving(cache, FAMILIES, n_candidates=27,
+#                              base_params={"XGBoost": {...}, ...})
+#   tuned["XGBoost"]["best_params"], tuned["XGBoost"]["trials"]
+# =============================================================================
+
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+
+# ── Search spaces (same grids as the notebook's RandomizedSearchCV runs) ─────
+PARAM_GRIDS = {
+    "XGBoost": {
+        "n_estimators": [100, 200, 300],
+        "max_depth": [4, 6, 8],
+        "learning_rate": [0.05, 0.1, 0.2],
+        "subsample": [0.70, 0.85, 1.0],
+        "colsample_bytree": [0.70, 0.85, 1.0],
+        "min_child_weight": [1, 3, 5],
+    },
+    "RandomForest": {
+        "n_estimators": [100, 200, 300],
+        "max_depth": [8, 12, 15, None],
+        "min_samples_split": [2, 5, 10],
+        "min_samples_leaf": [1, 2, 4],
+        "max_features": ["sqrt", "log2"],
+    },
+    "LightGBM": {
+        "n_estimators": [100, 200, 300],
+        "max_depth": [4, 6, 8],
+        "learning_rate": [0.05, 0.1, 0.2],
+        "num_leaves": [31, 63, 127],
+        "subsample": [0.70, 0.85, 1.0],
+        "colsample_bytree": [0.70, 0.85, 1.0],
+        "min_child_samples": [10, 20, 50],
+    },
+}
+FAMILIES = list(PARAM_GRIDS)
+
+CACHE_FILES = ("X.npy", "y.npy", "folds.json")
+
+
+def make_classifier(family, params):
+    """Unfitted classifier of `family`, single-threaded (the pool parallelises)."""
+    if family == "XGBoost":
+        import xgboost as xgb
+        return xgb.XGBClassifier(eval_metric="logloss", n_jobs=1, **params)
+    if family == "RandomForest":
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(n_jobs=1, **params)
+    if family == "LightGBM":
+        from lightgbm import LGBMClassifier
+        return LGBMClassifier(n_jobs=1, verbose=-1, **params)
+    raise ValueError(f"Unknown model family: {family!r}")
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 1. FOLD CACHE
+# ═════════════════════════════════════════════════════════════════════════════
+def _fingerprint(X: pd.DataFrame, y: pd.Series, n_splits) -> str:
+    h = hashlib.sha1()
+    h.update(np.asarray(pd.util.hash_pandas_object(X, index=False)).tobytes())
+    h.update(np.asarray(y, dtype=np.int8).tobytes())
+    h.update(f"{list(X.columns)}|{n_splits}".encode())
+    return h.hexdigest()[:16]
+
+
+def build_fold_cache(X: pd.DataFrame, y: pd.Series, preprocessor, n_splits, cache_dir) -> str:
+    """
+    Preprocess the (time-ordered) tuning sample once and write:
+      X.npy       (n_rows, n_features) float32, preprocessor output
+      y.npy       (n_rows,) int8
+      folds.json  TimeSeriesSplit folds as [train_end, val_end] row offsets
+
+    The preprocessor is fitted on the first fold's training window, i.e. on
+    data every fold trains on. The OrdinalEncoder only sees the binary shift
+    flags, whose categories are the same in every fold window, so this is
+    the encoding each fold's own pipeline would have learned.
+    Reuses an existing cache built from identical data.
+    """
+    from sklearn.base import clone
+    from sklearn.model_selection import TimeSeriesSplit
+
+    fingerprint = _fingerprint(X, y, n_splits)
+    meta_path = os.path.join(cache_dir, "folds.json")
+    if all(os.path.exists(os.path.join(cache_dir, f)) for f in CACHE_FILES):
+        with open(meta_path) as f:
+            if json.load(f)["fingerprint"] == fingerprint:
+                print(f"✓ Fold cache reused — {cache_dir}")
+                return cache_dir
+
+    folds = []
+    for tr_idx, val_idx in TimeSeriesSplit(n_splits=n_splits).split(X):
+        # TimeSeriesSplit folds are contiguous: train = [0, e), val = [e, v)
+        folds.append([int(tr_idx[-1]) + 1, int(val_idx[-1]) + 1])
+
+    enc = clone(preprocessor).fit(X.iloc[:folds[0][0]], y.iloc[:folds[0][0]])
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(os.path.join(cache_dir, "X.npy"), np.ascontiguousarray(enc.transform(X), dtype=np.float32))
+    np.save(os.path.join(cache_dir, "y.npy"), np.asarray(y, dtype=np.int8))
+    with open(meta_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "n_rows": len(X),
+                   "feature_names": list(X.columns), "folds": folds}, f, indent=1)
+    size = os.path.getsize(os.path.join(cache_dir, "X.npy")) / 1e6
+    print(f"✓ Fold cache built — {len(X):,} rows × {X.shape[1]} features "
+          f"({size:.1f} MB), {n_splits} folds → {cache_dir}")
+    return cache_dir
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 2. WORKERS
+# ═════════════════════════════════════════════════════════════════════════════
+_worker = {}
+
+
+def init_worker(cache_dir):
+    """Pool initializer: memory-map the cached matrices once per process."""
+    _worker["X"] = np.load(os.path.join(cache_dir, "X.npy"), mmap_mode="r")
+    _worker["y"] = np.load(os.path.join(cache_dir, "y.npy"), mmap_mode="r")
+
+
+def fit_fold(task) -> dict:
+    """
+    Fit one candidate on one fold and score ROC-AUC on its validation rows.
+    task = (family, trial, params, train_start, train_end, val_end)
+    """
+    from sklearn.metrics import roc_auc_score
+
+    family, trial, params, start, train_end, val_end = task
+    X, y = _worker["X"], _worker["y"]
+    t0 = time.perf_counter()
+    model = make_classifier(family, params)
+    model.fit(X[start:train_end], y[start:train_end])
+    probs = model.predict_proba(X[train_end:val_end])[:, 1]
+    auc = roc_auc_score(y[train_end:val_end], probs)
+    return {"family": family, "trial": trial, "auc": float(auc),
+            "fit_s": time.perf_counter() - t0, "rows": train_end - start}
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# 3. SUCCESSIVE HALVING
+# ═════════════════════════════════════════════════════════════════════════════
+def _rung_fractions(n_candidates, eta, min_fraction):
+    """
+    Training-window fraction per rung, growing by eta up to full folds.
+
+    The rung count is capped by both the candidates (no rung with a single
+    survivor before the last) and min_fraction (no rung below min_rows), so
+    the fractions stay a clean geometric ladder instead of piling up at
+    min_fraction.
+    """
+    by_candidates = max(int(math.ceil(math.log(n_candidates, eta))), 0)
+    by_rows = max(int(math.floor(math.log(1 / min_fraction, eta) + 1e-9)), 0)
+    n_rungs = min(by_candidates, by_rows) + 1
+    return [eta ** (r - n_rungs + 1) for r in range(n_rungs)]
+
+
+def successive_halving(cache_dir, families=FAMILIES, n_candidates=27, eta=3,
+                       min_rows=20_000, base_params=None, param_grids=None,
+                       max_workers=None, random_state=42, log_path=None) -> dict:
+    """
+    Successive-halving search over several model families at once.
+
+    cache_dir    : build_fold_cache output
+    n_candidates : settings sampled per family at the first rung
+    eta          : keep the best 1/eta per rung; rows grow by eta per rung
+    min_rows     : smallest per-fold training window at the first rung
+    base_params  : {family: fixed classifier params} (class weights, seed, ...)
+    log_path     : optional CSV of every (trial, rung, fold) fit
+
+    Returns {family: {"best_params", "best_score", "trials"}} where
+    best_params carry the notebook's "classifier__" pipeline prefix and
+    "trials" is the family's per-trial log (one row per trial and rung).
+    """
+    from sklearn.model_selection import ParameterSampler
+
+    base_params = base_params or {}
+    param_grids = param_grids or PARAM_GRIDS
+    with open(os.path.join(cache_dir, "folds.json")) as f:
+        folds = json.load(f)["folds"]
+    min_fraction = min(1.0, min_rows / folds[0][0])
+    fractions = _rung_fractions(n_candidates, eta, min_fraction)
+
+    candidates = {
+        fam: list(ParameterSampler(param_grids[fam], n_candidates, random_state=random_state))
+        for fam in families
+    }
+    alive = {fam: list(range(len(candidates[fam]))) for fam in families}
+    fits = []
+
+    print(f"Successive halving — {', '.join(families)}: {n_candidates} candidates each, "
+          f"eta={eta}, {len(fractions)} rungs, {len(folds)} folds")
+    t_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                             mp_context=mp.get_context("spawn"),
+                             initializer=init_worker, initargs=(cache_dir,)) as pool:
+        for rung, frac in enumerate(fractions):
+            tasks = []
+            for fam in families:
+                for trial in alive[fam]:
+                    params = {**candidates[fam][trial], **base_params.get(fam, {})}
+                    for train_end, val_end in folds:
+                        # the most recent `frac` of the fold's training window
+                        start = train_end - max(int(train_end * frac), 1)
+                        tasks.append((fam, trial, params, start, train_end, val_end))
+
+            t0 = time.perf_counter()
+            rung_fits = list(pool.map(fit_fold, tasks, chunksize=1))
+            for r in rung_fits:
+                r["rung"] = rung
+            fits += rung_fits
+            scores = (pd.DataFrame(rung_fits)
+                      .groupby(["family", "trial"])["auc"].mean())
+
+            for fam in families:
+                ranked = scores[fam].sort_values(ascending=False, kind="stable")
+                keep = 1 if rung == len(fractions) - 1 else max(int(math.ceil(len(ranked) / eta)), 1)
+                alive[fam] = ranked.index[:keep].tolist()
+            print(f"   rung {rung + 1}/{len(fractions)} — {len(tasks):>3} fits on "
+                  f"{frac:.0%} of each fold window, {time.perf_counter() - t0:.1f}s — best "
+                  + ", ".join(f"{fam} {scores[fam].max():.4f}" for fam in families))
+
+    log = pd.DataFrame(fits)
+    if log_path:
+        log.to_csv(log_path, index=False)
+    print(f"✓ Tuning finished in {time.perf_counter() - t_start:.1f}s "
+          f"({len(log)} fold fits, {log['fit_s'].sum():.1f}s of worker time)")
+
+    results = {}
+    for fam in families:
+        trials = (log[log["family"] == fam]
+                  .groupby(["trial", "rung"])
+                  .agg(rows=("rows", "max"), mean_auc=("auc", "mean"),
+                       std_auc=("auc", "std"), fit_s_total=("fit_s", "sum"))
+                  .reset_index())
+        trials["params"] = [candidates[fam][t] for t in trials["trial"]]
+        best = alive[fam][0]
+        final = trials[(trials["trial"] == best) & (trials["rung"] == len(fractions) - 1)]
+        results[fam] = {
+            "best_params": {f"classifier__{k}": v for k, v in candidates[fam][best].items()},
+            "best_score": float(final["mean_auc"].iloc[0]),
+            "trials": trials,
+        }
+    return results